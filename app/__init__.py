@@ -1,9 +1,31 @@
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app.services import json_backend
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider encoding and decoding through the configured JSON backend (orjson or msgspec if installed)"""
+
+    # Keys keep their insertion order, which also spares sorting every response
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        # Indented output (debug mode) and other explicit options go through the standard library
+        if kwargs.get("indent") is not None or set(kwargs) - {"separators"}:
+            return super().dumps(obj, **kwargs)
+        return json_backend.dumps(obj, default=self.default)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return json_backend.loads(s)
 
 
 def create_app(config_name=None):
     """Application factory pattern for creating the Flask app"""
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
 
     # Load configuration
     from app.config import config_by_name
@@ -15,6 +15,70 @@ class Config:
     APP_DESCRIPTION = "Sentinel Hydrological Observation & Resource Explorer"
     OPENEO_PROVIDER_URL = 'https://openeo.dataspace.copernicus.eu/'
     DMI_API_KEY = os.getenv('DMI_API_KEY', '')
+    # Seconds before the cached DMI station catalogue is refreshed in the background
+    STATION_CATALOGUE_TTL = int(os.getenv('STATION_CATALOGUE_TTL', 3600))
+    # Maximum number of concurrent DMI requests for many stations, and STAC requests for many items
+    ENRICHMENT_MAX_WORKERS = int(os.getenv('ENRICHMENT_MAX_WORKERS', 8))
+
+    # SQLite file caching DMI observations (defaults to the instance folder, empty string disables it)
+    OBSERVATION_STORE_PATH = os.getenv('OBSERVATION_STORE_PATH')
+    # Observations older than this many days are served from the store once DMI has quality controlled them
+    OBSERVATION_FINAL_AFTER_DAYS = float(os.getenv('OBSERVATION_FINAL_AFTER_DAYS', 30))
+
+    # JSON file with the closest stations per Sentinel-2 tile (defaults to the instance folder,
+    # empty string keeps it in memory only) and the number of fallback stations kept per tile
+    TILE_STATION_INDEX_PATH = os.getenv('TILE_STATION_INDEX_PATH')
+    TILE_STATION_CANDIDATES = int(os.getenv('TILE_STATION_CANDIDATES', 3))
+    # Stations further than this many metres from an image are not used for it (unset for no limit)
+    STATION_MAX_DISTANCE = float(os.environ['STATION_MAX_DISTANCE']) if os.getenv('STATION_MAX_DISTANCE') else None
+    # Most points accepted by one /api/nearest_stations request; larger batches are rejected with 413
+    NEAREST_STATIONS_MAX_POINTS = int(os.getenv('NEAREST_STATIONS_MAX_POINTS', 1000))
+
+    # On-disk cache of proxied preview images (defaults to the instance folder) and its size cap
+    PREVIEW_CACHE_PATH = os.getenv('PREVIEW_CACHE_PATH')
+    PREVIEW_CACHE_MAX_BYTES = int(os.getenv('PREVIEW_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+    # Search result cache; set REDIS_URL to share it between gunicorn workers
+    SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 256))
+    SEARCH_CACHE_RECENT_TTL = int(os.getenv('SEARCH_CACHE_RECENT_TTL', 300))
+    SEARCH_CACHE_HISTORIC_TTL = int(os.getenv('SEARCH_CACHE_HISTORIC_TTL', 7 * 24 * 3600))
+    SEARCH_CACHE_BBOX_TOLERANCE = float(os.getenv('SEARCH_CACHE_BBOX_TOLERANCE', 0.001))
+    REDIS_URL = os.getenv('REDIS_URL')
+    # Cache of STAC item assets for download links (shared through REDIS_URL as well)
+    ITEM_ASSET_CACHE_MAX_ENTRIES = int(os.getenv('ITEM_ASSET_CACHE_MAX_ENTRIES', 4096))
+    ITEM_ASSET_CACHE_TTL = int(os.getenv('ITEM_ASSET_CACHE_TTL', 30 * 24 * 3600))
+    # Upstream pages scanned at most per request when the STAC API cannot filter cloud coverage;
+    # pages cut short by this limit are returned partially, with `next` set
+    SEARCH_REFILL_MAX_PAGES = int(os.getenv('SEARCH_REFILL_MAX_PAGES', 10))
+
+    # STAC search method fallback: skip a method after this many consecutive failures,
+    # retry it with regular traffic after the reset timeout and probe GET in the background
+    STAC_BREAKER_FAILURE_THRESHOLD = int(os.getenv('STAC_BREAKER_FAILURE_THRESHOLD', 3))
+    STAC_BREAKER_RESET_TIMEOUT = int(os.getenv('STAC_BREAKER_RESET_TIMEOUT', 300))
+    STAC_PROBE_INTERVAL = int(os.getenv('STAC_PROBE_INTERVAL', 60))
+
+    # Outbound HTTP connection pools (one per service and gunicorn worker process).
+    # Keep-alive connections per host. Each service's session is shared by the request handlers
+    # (GUNICORN_THREADS at a time with gthread workers) and by the service's one thread pool of
+    # ENRICHMENT_MAX_WORKERS per process, so the default covers both at once. With the default
+    # gevent workers (see gunicorn.conf.py) requests are not bounded by threads: calls beyond the
+    # pool size still run concurrently, but their extra connections are closed instead of kept alive.
+    GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', 4))
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', GUNICORN_THREADS + ENRICHMENT_MAX_WORKERS))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+    STAC_READ_TIMEOUT = float(os.getenv('STAC_READ_TIMEOUT', 60))
+    DMI_READ_TIMEOUT = float(os.getenv('DMI_READ_TIMEOUT', 30))
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 3))
+    HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', 0.5))
+
+    # JSON library for upstream responses and API responses: auto, orjson, msgspec or json.
+    # With msgspec installed, STAC search and DMI observation pages are only partially decoded.
+    JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto')
+
+    # Compression of API responses and pages larger than this many bytes (brotli needs the brotli package)
+    COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))
+    GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+    BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 5))
 
 
 class DevelopmentConfig(Config):
@@ -0,0 +1,79 @@
+# app/services/circuit_breaker.py
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class CircuitBreaker:
+    """Tracks the health of an upstream call path and stops using it after repeated failures"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 300):
+        """
+        Parameters:
+        - name: Name of the call path, used in logs and statistics
+        - failure_threshold: Consecutive failures after which the circuit opens
+        - reset_timeout: Seconds an open circuit waits before letting a trial call through
+        """
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._consecutive_failures = 0
+        self._failures = 0
+        self._successes = 0
+        self._last_error = None
+
+    @property
+    def state(self) -> str:
+        """Current state, moving an open circuit to half-open once the reset timeout has passed"""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Return whether the call path should be used"""
+        return self.state != self.OPEN
+
+    def record_success(self):
+        """Record a successful call and close the circuit"""
+        with self._lock:
+            if self._state != self.CLOSED:
+                self.logger.info(f"Circuit {self.name} closed")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._successes += 1
+
+    def record_failure(self, error: Optional[Exception] = None):
+        """Record a failed call, opening the circuit after too many consecutive failures"""
+        with self._lock:
+            self._consecutive_failures += 1
+            self._failures += 1
+            self._last_error = str(error) if error else None
+            if self._state == self.HALF_OPEN or (
+                    self._state == self.CLOSED and self._consecutive_failures >= self.failure_threshold):
+                self.logger.warning(f"Circuit {self.name} opened after {self._consecutive_failures} "
+                                    f"consecutive failures: {self._last_error}")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return the state and failure counts for monitoring"""
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._consecutive_failures,
+                "failures": self._failures,
+                "successes": self._successes,
+                "last_error": self._last_error
+            }
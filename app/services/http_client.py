@@ -0,0 +1,262 @@
+# app/services/http_client.py
+import json
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.services import metrics
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+class _Flight:
+    """An upstream request in progress that identical requests wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class HttpClient:
+    """
+    Pooled keep-alive HTTP client with per-host timeouts and retries with jittered backoff
+
+    Identical requests that are in flight at the same time are coalesced: the first one is
+    sent upstream and the others wait for it and share its response.
+    """
+
+    RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(self, name: str, pool_maxsize: int = 10, timeout: Timeout = (5, 30),
+                 host_timeouts: Optional[Dict[str, Timeout]] = None, max_retries: int = 3,
+                 backoff_factor: float = 0.5, backoff_max: float = 10):
+        """
+        Parameters:
+        - name: Name of the client, used in logs and statistics
+        - pool_maxsize: Maximum number of keep-alive connections kept per host
+        - timeout: Default (connect, read) timeout in seconds
+        - host_timeouts: Optional mapping of host name to (connect, read) timeout
+        - max_retries: Number of retries on connection errors and 429/5xx responses
+        - backoff_factor: Base delay in seconds for the exponential backoff
+        - backoff_max: Upper bound in seconds for a single backoff delay
+        """
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.host_timeouts = dict(host_timeouts or {})
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+
+        self._stats_lock = threading.Lock()
+        self._retries = 0
+        self._failures = 0
+        self._flights = {}
+        self._coalesced = 0
+        self.session = self._create_session()
+
+    def configure(self, pool_maxsize: Optional[int] = None, timeout: Optional[Timeout] = None,
+                  host_timeouts: Optional[Dict[str, Timeout]] = None, max_retries: Optional[int] = None,
+                  backoff_factor: Optional[float] = None):
+        """Update the client options; the session is only rebuilt when the pool size changes"""
+        if timeout is not None:
+            self.timeout = timeout
+        if host_timeouts is not None:
+            self.host_timeouts.update(host_timeouts)
+        if max_retries is not None:
+            self.max_retries = max_retries
+        if backoff_factor is not None:
+            self.backoff_factor = backoff_factor
+        if pool_maxsize is not None and pool_maxsize != self.pool_maxsize:
+            self.pool_maxsize = pool_maxsize
+            old_session = self.session
+            self.session = self._create_session()
+            old_session.close()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Send a GET request"""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """Send a POST request"""
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request through the pooled session, retrying transient failures
+
+        A request identical to one already in flight (same method, URL, params and body)
+        is not sent again but gets the response of the request in flight.
+
+        Parameters:
+        - method: HTTP method
+        - url: URL to request
+        - kwargs: Passed on to requests.Session.request
+
+        Returns:
+        - The response of the last attempt
+        """
+        key = self._flight_key(method, url, kwargs)
+        if key is None:
+            return self._send(method, url, **kwargs)
+
+        with self._stats_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            flight.response = self._send(method, url, **kwargs)
+            # Read the body now so every waiter can parse it
+            flight.response.content
+            return flight.response
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._stats_lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request through the pooled session, retrying transient failures"""
+        kwargs.setdefault("timeout", self._timeout_for(url))
+
+        attempt = 0
+        while True:
+            try:
+                response = self._timed_request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    self._record_failure()
+                    raise
+                delay = self._backoff_delay(attempt)
+                self.logger.warning(f"{self.name}: {method} {url} failed ({str(e)}), retrying in {delay:.2f}s")
+            else:
+                if response.status_code not in self.RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    if response.status_code in self.RETRY_STATUS_CODES:
+                        self._record_failure()
+                    return response
+                delay = self._retry_after(response)
+                if delay is None:
+                    delay = self._backoff_delay(attempt)
+                self.logger.warning(f"{self.name}: {method} {url} returned {response.status_code}, "
+                                    f"retrying in {delay:.2f}s")
+                # Release the connection back to the pool before sleeping
+                response.close()
+
+            with self._stats_lock:
+                self._retries += 1
+            attempt += 1
+            time.sleep(delay)
+
+    def _timed_request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send one attempt of a request, recording its latency and size in the metrics"""
+        parts = urlsplit(url)
+        started = time.perf_counter()
+        status = "error"
+        nbytes = 0
+        try:
+            response = self.session.request(method, url, **kwargs)
+            status = str(response.status_code)
+            if kwargs.get("stream"):
+                nbytes = int(response.headers.get("Content-Length") or 0)
+            else:
+                nbytes = len(response.content)
+            return response
+        finally:
+            metrics.record_upstream(self.name, parts.hostname or "", metrics.normalize_endpoint(parts.path),
+                                    status, time.perf_counter() - started, nbytes)
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        Get connection pool statistics for monitoring
+
+        Returns:
+        - Dictionary with per-host request and connection counts and the connection reuse rate
+        """
+        hosts = {}
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host_stats = hosts.setdefault(pool.host, {"requests": 0, "connections": 0})
+                host_stats["requests"] += pool.num_requests
+                host_stats["connections"] += pool.num_connections
+
+        for host_stats in hosts.values():
+            reused = max(0, host_stats["requests"] - host_stats["connections"])
+            host_stats["hit_rate"] = reused / host_stats["requests"] if host_stats["requests"] else None
+
+        with self._stats_lock:
+            return {
+                "pool_maxsize": self.pool_maxsize,
+                "retries": self._retries,
+                "failures": self._failures,
+                "coalesced": self._coalesced,
+                "hosts": hosts
+            }
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+    def _create_session(self) -> requests.Session:
+        """Create a session whose adapters keep up to `pool_maxsize` connections per host"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=self.pool_maxsize, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @staticmethod
+    def _flight_key(method: str, url: str, kwargs: Dict[str, Any]) -> Optional[str]:
+        """Return the key identifying identical requests, or None if the request cannot be shared"""
+        if kwargs.get("stream") or kwargs.get("data") is not None or kwargs.get("files") is not None:
+            return None
+        params = kwargs.get("params")
+        if isinstance(params, dict):
+            params = sorted(params.items())
+        try:
+            return json.dumps([method.upper(), url, params, kwargs.get("json"), kwargs.get("headers")],
+                              sort_keys=True, default=str)
+        except TypeError:
+            return None
+
+    def _timeout_for(self, url: str) -> Timeout:
+        """Return the timeout configured for the host of a URL"""
+        return self.host_timeouts.get(urlsplit(url).hostname, self.timeout)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        """Return the delay requested by a numeric Retry-After header, capped to the maximum backoff"""
+        try:
+            return min(self.backoff_max, max(0.0, float(response.headers.get("Retry-After"))))
+        except (TypeError, ValueError):
+            return None
+
+    def _record_failure(self):
+        with self._stats_lock:
+            self._failures += 1
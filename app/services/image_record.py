@@ -0,0 +1,229 @@
+# app/services/image_record.py
+import copy
+import datetime
+import json
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from shapely.geometry import shape
+
+from app.services import json_backend
+
+# Spectral bands of Sentinel-2 products, in the order they are listed
+SENTINEL2_BANDS = ("B01", "B02", "B03", "B04", "B05", "B06", "B07", "B08", "B8A", "B09", "B10", "B11", "B12")
+DEFAULT_BANDS = ("B02", "B03", "B04", "B08")
+
+_encode = json.JSONEncoder(separators=(",", ":")).encode
+# Products of one collection list the same bands, so records share one tuple per band set
+_band_sets = {DEFAULT_BANDS: DEFAULT_BANDS}
+
+
+class ImageRecord:
+    """
+    Processed search result for one Sentinel-2 product
+
+    Records hold only the fields the API returns and write their own JSON, so large result
+    pages are neither expanded into nested dictionaries nor copied before serialization.
+    """
+
+    __slots__ = ("id", "date", "timestamp", "cloud_coverage", "preview_url", "sun_azimuth", "sun_elevation",
+                 "bands", "center", "platform", "instrument", "product_type", "orbit", "tile_id", "water_level")
+
+    def __init__(self, id: str, date: str, timestamp: str, cloud_coverage: float = 0,
+                 preview_url: Optional[str] = None, sun_azimuth: Optional[float] = None,
+                 sun_elevation: Optional[float] = None, bands: Tuple[str, ...] = DEFAULT_BANDS,
+                 center: Optional[Sequence[float]] = None, platform: str = "Sentinel-2", instrument: str = "MSI",
+                 product_type: str = "L2A", orbit: Optional[str] = None, tile_id: Optional[str] = None,
+                 water_level: Optional[Dict[str, Any]] = None):
+        """
+        Parameters:
+        - id: Product ID without the .SAFE suffix
+        - date: Acquisition time in ISO format
+        - timestamp: Acquisition time as used for water level lookups (YYYY-MM-DDTHH:MM:SSZ)
+        - center: [lon, lat] the nearest water level stations are searched from, or None
+        - water_level: waterLevel block, or None until the record is enriched
+        Other parameters are returned as is.
+        """
+        self.id = id
+        self.date = date
+        self.timestamp = timestamp
+        self.cloud_coverage = cloud_coverage
+        self.preview_url = preview_url
+        self.sun_azimuth = sun_azimuth
+        self.sun_elevation = sun_elevation
+        self.bands = bands
+        self.center = center
+        self.platform = platform
+        self.instrument = instrument
+        self.product_type = product_type
+        self.orbit = orbit
+        self.tile_id = tile_id
+        self.water_level = water_level
+
+    @classmethod
+    def from_feature(cls, feature: Dict[str, Any], preview_url: Optional[str] = None) -> "ImageRecord":
+        """
+        Build a record from a STAC item in one pass over its properties and assets
+
+        Parameters:
+        - feature: STAC item
+        - preview_url: URL of the item's preview image
+
+        Returns:
+        - The record
+        """
+        properties = feature.get("properties", {})
+        date, timestamp = parse_datetime(properties.get("datetime"))
+
+        assets = feature.get("assets") or {}
+        bands = tuple(band for band in SENTINEL2_BANDS if band in assets) or DEFAULT_BANDS
+
+        return cls(
+            id=feature.get("id", "").replace(".SAFE", ""),
+            date=date,
+            timestamp=timestamp,
+            cloud_coverage=properties.get("eo:cloud_cover", 0),
+            preview_url=preview_url,
+            sun_azimuth=properties.get("view:sun_azimuth"),
+            sun_elevation=properties.get("view:sun_elevation"),
+            bands=_band_sets.setdefault(bands, bands),
+            center=feature_center(feature),
+            platform=properties.get("platform", "Sentinel-2"),
+            instrument=properties.get("instrument", "MSI"),
+            product_type=properties.get("s2:product_type", "L2A"),
+            orbit=properties.get("sat:orbit_state"),
+            tile_id=properties.get("s2:tile_id")
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ImageRecord":
+        """Rebuild a record from its JSON representation"""
+        metadata = data.get("metadata") or {}
+        date, timestamp = parse_datetime(data.get("date"))
+        bands = tuple(data.get("bands") or DEFAULT_BANDS)
+        return cls(
+            id=data.get("id"),
+            date=data.get("date") or date,
+            timestamp=timestamp,
+            cloud_coverage=data.get("cloudCoverage", 0),
+            preview_url=data.get("preview_url"),
+            sun_azimuth=data.get("sun_azimuth"),
+            sun_elevation=data.get("sun_elevation"),
+            bands=_band_sets.setdefault(bands, bands),
+            center=data.get("center"),
+            platform=metadata.get("platform", "Sentinel-2"),
+            instrument=metadata.get("instrument", "MSI"),
+            product_type=metadata.get("productType", "L2A"),
+            orbit=metadata.get("orbit"),
+            tile_id=metadata.get("tile_id"),
+            water_level=data.get("waterLevel")
+        )
+
+    def copy(self) -> "ImageRecord":
+        """Return a shallow copy, e.g. to enrich a page without touching the cached one"""
+        return copy.copy(self)
+
+    def to_json(self, internal: bool = False) -> str:
+        """
+        Serialize the record to JSON, with the waterLevel block once the record is enriched
+
+        Parameters:
+        - internal: Whether to include the fields only used server-side (the station lookup `center`),
+          for caches; API responses leave them out
+        """
+        text = (f'{{"id":{_encode(self.id)},"date":{_encode(self.date)},'
+                f'"cloudCoverage":{_encode(self.cloud_coverage)},"preview_url":{_encode(self.preview_url)},'
+                f'"sun_azimuth":{_encode(self.sun_azimuth)},"sun_elevation":{_encode(self.sun_elevation)},'
+                f'"bands":{_encode(self.bands)},')
+        if internal:
+            text += f'"center":{_encode(self.center)},'
+        text += (f'"metadata":{{"platform":{_encode(self.platform)},"instrument":{_encode(self.instrument)},'
+                f'"productType":{_encode(self.product_type)},"epsg":4326,"orbit":{_encode(self.orbit)},'
+                f'"tile_id":{_encode(self.tile_id)}}}')
+        if self.water_level is not None:
+            text += f',"waterLevel":{_encode(self.water_level)}'
+        return text + "}"
+
+
+def parse_datetime(value: Optional[str]) -> Tuple[str, str]:
+    """
+    Parse a STAC datetime
+
+    Whole-second UTC times, the usual form (e.g. 2024-05-30T10:40:21Z or 2024-05-30T10:40:21.000000Z),
+    are handled by slicing the string; other forms go through datetime parsing.
+
+    Returns:
+    - Tuple of the ISO format time and the YYYY-MM-DDTHH:MM:SSZ time used for water level lookups
+    """
+    if value and len(value) >= 20 and value[-1] == "Z" and value[10] == "T" and not value[19:-1].strip(".0"):
+        return f"{value[:19]}+00:00", f"{value[:19]}Z"
+
+    try:
+        date_obj = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        # Fallback if the date is missing or its format is unexpected
+        date_obj = datetime.datetime.now()
+    utc = date_obj.astimezone(datetime.timezone.utc) if date_obj.tzinfo else date_obj
+    return date_obj.isoformat(), utc.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def feature_center(feature: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """Return the centre of a STAC item's bbox, falling back to the bounds of its geometry"""
+    bbox = feature.get("bbox")
+    if bbox and len(bbox) in (4, 6):
+        half = len(bbox) // 2
+        return (bbox[0] + bbox[half]) / 2, (bbox[1] + bbox[half + 1]) / 2
+
+    geometry = json_backend.materialize(feature.get("geometry"))
+    if geometry:
+        bounds = shape(geometry).bounds
+        return (bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2
+    return None
+
+
+def dumps(value: Any) -> str:
+    """Serialize a value to JSON, writing the image records it contains with ImageRecord.to_json"""
+    return json_backend.dumps(value)
+
+
+class _InternalRecord:
+    """Image record written with its internal fields, see cache_dumps"""
+
+    __slots__ = ("record",)
+
+    def __init__(self, record: ImageRecord):
+        self.record = record
+
+    def to_json(self) -> str:
+        return self.record.to_json(internal=True)
+
+
+def _wrap_records(value: Any) -> Any:
+    """Wrap the image records in a value so they are written with their internal fields"""
+    if isinstance(value, ImageRecord):
+        return _InternalRecord(value)
+    if isinstance(value, dict):
+        return {key: _wrap_records(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_wrap_records(item) for item in value]
+    return value
+
+
+def cache_dumps(value: Any) -> str:
+    """Serialize a value to JSON for a cache, keeping the internal fields of its image records for loads"""
+    return json_backend.dumps(_wrap_records(value))
+
+
+def _restore_records(data: Any) -> Any:
+    """Turn the `images` of decoded search results back into records"""
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key == "images" and isinstance(value, list):
+                data[key] = [ImageRecord.from_dict(image) if isinstance(image, dict) else image for image in value]
+            elif isinstance(value, dict):
+                _restore_records(value)
+    return data
+
+
+def loads(text: str) -> Any:
+    """Parse JSON written by dumps, rebuilding the image records of search results"""
+    return _restore_records(json_backend.loads(text))
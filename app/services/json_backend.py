@@ -0,0 +1,186 @@
+# app/services/json_backend.py
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, TypedDict, Union
+
+try:
+    import orjson
+except ImportError:  # Faster JSON is optional
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # Faster JSON and partial decoding of upstream pages are optional
+    msgspec = None
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("auto", "orjson", "msgspec", "json")
+
+# STAC item properties read from search pages (by ImageRecord.from_feature and the cloud filters)
+SEARCH_ITEM_PROPERTIES = ("datetime", "eo:cloud_cover", "view:sun_azimuth", "view:sun_elevation", "platform",
+                          "instrument", "s2:product_type", "sat:orbit_state", "s2:tile_id")
+# DMI observation properties read by ObservationSeries.from_features and the snapshot
+OBSERVATION_PROPERTIES = ("stationId", "observed", "value", "qcStatus")
+
+_backend = "json"
+_partial = False
+_stdlib_encode = json.JSONEncoder(separators=(",", ":")).encode
+
+if msgspec is not None:
+    # TypedDicts decode into plain dictionaries and skip every field they do not list. Item geometries
+    # are kept as raw JSON and only parsed for the rare items without a bbox.
+    _SearchItemProperties = TypedDict("_SearchItemProperties", {name: Any for name in SEARCH_ITEM_PROPERTIES},
+                                      total=False)
+    _SearchAsset = TypedDict("_SearchAsset", {"href": Any, "type": Any}, total=False)
+    _SearchItem = TypedDict("_SearchItem", {"id": Any, "bbox": Any, "geometry": msgspec.Raw,
+                                            "properties": _SearchItemProperties,
+                                            "assets": Dict[str, _SearchAsset]}, total=False)
+    _SearchPage = TypedDict("_SearchPage", {"features": List[_SearchItem], "links": List[Dict[str, Any]],
+                                            "context": Dict[str, Any]}, total=False)
+
+    _ObservationProperties = TypedDict("_ObservationProperties", {name: Any for name in OBSERVATION_PROPERTIES},
+                                       total=False)
+    _Observation = TypedDict("_Observation", {"properties": _ObservationProperties}, total=False)
+    _ObservationPage = TypedDict("_ObservationPage", {"features": List[_Observation]}, total=False)
+
+    _search_page_decoder = msgspec.json.Decoder(_SearchPage)
+    _observation_page_decoder = msgspec.json.Decoder(_ObservationPage)
+    _msgspec_decoder = msgspec.json.Decoder()
+
+
+def set_backend(name: str = "auto") -> str:
+    """
+    Select the JSON library used to decode upstream responses and encode API responses
+
+    Parameters:
+    - name: 'orjson', 'msgspec', 'json' (standard library) or 'auto' for the fastest one installed
+
+    Returns:
+    - Name of the backend in use; the standard library if the requested one is not installed
+    """
+    global _backend, _partial
+    available = {"orjson": orjson is not None, "msgspec": msgspec is not None, "json": True}
+    if name == "auto":
+        name = next(backend for backend in ("orjson", "msgspec", "json") if available[backend])
+    elif not available.get(name):
+        logger.warning(f"JSON backend {name} is not available, using the standard library")
+        name = "json"
+
+    _backend = name
+    # Partial decoding of upstream pages needs msgspec, whichever library encodes responses
+    _partial = msgspec is not None and name != "json"
+    return name
+
+
+def get_backend() -> str:
+    """Return the name of the JSON backend in use"""
+    return _backend
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode a JSON document"""
+    if _backend == "orjson":
+        return orjson.loads(data)
+    if _backend == "msgspec":
+        return _msgspec_decoder.decode(data)
+    return json.loads(data)
+
+
+def loads_search_page(data: Union[bytes, str]) -> Dict[str, Any]:
+    """
+    Decode a STAC search page, keeping only what search results are built from
+
+    With msgspec installed only the item ID, bbox, the properties in SEARCH_ITEM_PROPERTIES and the
+    asset hrefs are materialized; geometries stay raw JSON (see materialize). Otherwise the whole
+    page is decoded.
+    """
+    if _partial:
+        try:
+            return _search_page_decoder.decode(data)
+        except msgspec.ValidationError as e:
+            logger.warning(f"Unexpected STAC search page, decoding it in full: {str(e)}")
+    return loads(data)
+
+
+def loads_observation_page(data: Union[bytes, str]) -> Dict[str, Any]:
+    """Decode a DMI observation page, keeping only the properties in OBSERVATION_PROPERTIES when possible"""
+    if _partial:
+        try:
+            return _observation_page_decoder.decode(data)
+        except msgspec.ValidationError as e:
+            logger.warning(f"Unexpected DMI observation page, decoding it in full: {str(e)}")
+    return loads(data)
+
+
+def materialize(value: Any) -> Any:
+    """Decode a value left as raw JSON by partial decoding, or return it unchanged"""
+    if msgspec is not None and isinstance(value, msgspec.Raw):
+        return _msgspec_decoder.decode(value)
+    return value
+
+
+def dumps(value: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """
+    Encode a value as compact JSON
+
+    Objects with a `to_json` method (such as image records) are embedded as the JSON text it returns.
+
+    Parameters:
+    - value: Value to encode
+    - default: Optional function converting other unsupported objects into encodable values
+    """
+    if _backend == "orjson" and hasattr(orjson, "Fragment"):
+        try:
+            return orjson.dumps(value, default=_orjson_default(default), option=orjson.OPT_SERIALIZE_NUMPY).decode()
+        except TypeError:
+            pass  # e.g. non-string keys; the standard library path handles them
+    elif _backend == "msgspec":
+        try:
+            return msgspec.json.encode(value, enc_hook=_msgspec_hook(default)).decode()
+        except (TypeError, msgspec.EncodeError):
+            pass
+
+    if _backend == "orjson":
+        # orjson before 3.9 cannot embed JSON text, so only the leaves go through it
+        return _dumps_tree(value, lambda leaf: orjson.dumps(leaf, default=default,
+                                                            option=orjson.OPT_SERIALIZE_NUMPY).decode())
+    encode = json.JSONEncoder(separators=(",", ":"), default=default).encode if default else _stdlib_encode
+    return _dumps_tree(value, encode)
+
+
+def _dumps_tree(value: Any, encode: Callable[[Any], str]) -> str:
+    """Encode dictionaries and lists item by item, so objects with a `to_json` method can be embedded"""
+    if hasattr(value, "to_json"):
+        return value.to_json()
+    if isinstance(value, dict):
+        return "{" + ",".join(f"{_stdlib_encode(str(key))}:{_dumps_tree(item, encode)}"
+                              for key, item in value.items()) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(_dumps_tree(item, encode) for item in value) + "]"
+    return encode(value)
+
+
+def _orjson_default(default: Optional[Callable[[Any], Any]]) -> Callable[[Any], Any]:
+    """Build the orjson default hook embedding `to_json` output"""
+    def hook(value):
+        if hasattr(value, "to_json"):
+            return orjson.Fragment(value.to_json())
+        if default is not None:
+            return default(value)
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    return hook
+
+
+def _msgspec_hook(default: Optional[Callable[[Any], Any]]) -> Callable[[Any], Any]:
+    """Build the msgspec encode hook embedding `to_json` output"""
+    def hook(value):
+        if hasattr(value, "to_json"):
+            return msgspec.Raw(value.to_json().encode())
+        if default is not None:
+            return default(value)
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    return hook
+
+
+set_backend("auto")
@@ -0,0 +1,223 @@
+# app/services/metrics.py
+import contextvars
+import functools
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Upper bounds in seconds of the latency histogram buckets
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Path segments that identify a single resource are collapsed so endpoints stay few
+_ID_SEGMENT = re.compile(r"^(?=.*\d)[\w.:-]{16,}$|\.SAFE$")
+# OData entity keys in a path segment, e.g. Assets(<uuid>)
+_ODATA_KEY = re.compile(r"\([^/()]*\)")
+
+_current_trace = contextvars.ContextVar("shore_request_trace", default=None)
+
+
+class RequestTrace:
+    """Timings of the upstream calls and code sections of one API request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        # Name -> [count, seconds, bytes]
+        self._entries = {}
+
+    def add(self, name: str, seconds: float, nbytes: int = 0):
+        """Add one timed call or section to the trace"""
+        with self._lock:
+            entry = self._entries.setdefault(name, [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += nbytes
+
+    def server_timing(self) -> str:
+        """Format the trace as a Server-Timing header value, durations in milliseconds"""
+        with self._lock:
+            entries = sorted(self._entries.items())
+        metrics = [f'{name};dur={seconds * 1000:.1f};desc="{count} calls, {nbytes} bytes"'
+                   if nbytes else f'{name};dur={seconds * 1000:.1f};desc="{count} calls"'
+                   for name, (count, seconds, nbytes) in entries]
+        metrics.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+class Histogram:
+    """Cumulative latency histogram with the Prometheus bucket layout"""
+
+    def __init__(self):
+        self.counts = [0] * (len(DURATION_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        """Count a duration in its bucket"""
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Process-wide counters and latency histograms, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+
+    def inc(self, name: str, labels: Dict[str, str], value: float = 1, help_text: str = ""):
+        """Increment a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._help.setdefault(name, help_text)
+
+    def observe(self, name: str, labels: Dict[str, str], seconds: float, help_text: str = ""):
+        """Record a duration in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+            self._help.setdefault(name, help_text)
+
+    def render(self, collected: Optional[List[Tuple[str, str, Dict[str, str], Any, str]]] = None) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format
+
+        Parameters:
+        - collected: Optional list of (name, type, labels, value, help) samples read at scrape time,
+          such as cache hit counts and sizes
+
+        Returns:
+        - The metrics as text
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            help_texts = dict(self._help)
+            histograms = [(key, list(h.counts), h.sum, h.count) for key, h in histograms]
+
+        self._render_family(lines, counters, "counter", help_texts)
+
+        typed = set()
+        for (name, labels), counts, total, count in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# HELP {name} {help_texts.get(name, '')}")
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(DURATION_BUCKETS + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        for metric_type in ("counter", "gauge"):
+            samples = sorted(((name, tuple(sorted(labels.items()))), value)
+                             for name, sample_type, labels, value, _ in collected or []
+                             if sample_type == metric_type and value is not None)
+            self._render_family(lines, samples, metric_type,
+                                {name: help_text for name, _, _, _, help_text in collected or []})
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_family(lines: List[str], samples, metric_type: str, help_texts: Dict[str, str]):
+        """Append samples of counters or gauges, with a HELP and TYPE line before each metric"""
+        typed = set()
+        for (name, labels), value in samples:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# HELP {name} {help_texts.get(name, '')}")
+                lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name}{_labels(labels)} {float(value):g}")
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    """Format Prometheus labels"""
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+registry = MetricsRegistry()
+
+
+def start_trace() -> contextvars.Token:
+    """Start the trace of the current request"""
+    return _current_trace.set(RequestTrace())
+
+
+def end_trace(token: contextvars.Token):
+    """End the trace started with start_trace"""
+    try:
+        _current_trace.reset(token)
+    except ValueError:
+        # Streamed responses are torn down from the response generator's context
+        _current_trace.set(None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    """Return the trace of the current request, or None outside of a request"""
+    return _current_trace.get()
+
+
+def in_current_context(function: Callable) -> Callable:
+    """Wrap a function so it runs in a copy of the current context, keeping the trace in worker threads"""
+    return functools.partial(contextvars.copy_context().run, function)
+
+
+def normalize_endpoint(path: str) -> str:
+    """
+    Collapse resource identifiers in a URL path, e.g. /collections/SENTINEL-2/items/{id}
+    or /odata/v1/Assets({id})/$value
+    """
+    return "/".join("{id}" if _ID_SEGMENT.search(segment) else _ODATA_KEY.sub("({id})", segment)
+                    for segment in path.split("/")) or "/"
+
+
+def record_upstream(client: str, host: str, endpoint: str, status: str, seconds: float, nbytes: int):
+    """Record one upstream HTTP call in the request trace and the process-wide metrics"""
+    trace = current_trace()
+    if trace is not None:
+        trace.add(client, seconds, nbytes)
+
+    labels = {"client": client, "host": host, "endpoint": endpoint}
+    registry.inc("shore_upstream_requests_total", dict(labels, status=status),
+                 help_text="Upstream HTTP calls by host, endpoint and status")
+    registry.observe("shore_upstream_request_duration_seconds", labels, seconds,
+                     help_text="Latency of upstream HTTP calls")
+    registry.inc("shore_upstream_response_bytes_total", labels, nbytes,
+                 help_text="Bytes received from upstream HTTP calls")
+
+
+@contextmanager
+def timed(section: str):
+    """Time a code section in the request trace and the process-wide metrics"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        trace = current_trace()
+        if trace is not None:
+            trace.add(section, seconds)
+        registry.observe("shore_section_duration_seconds", {"section": section}, seconds,
+                         help_text="Time spent in instrumented code sections")
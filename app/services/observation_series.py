@@ -0,0 +1,87 @@
+# app/services/observation_series.py
+import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+def parse_timestamp(timestamp: str) -> datetime.datetime:
+    """Parse an ISO 8601 timestamp, treating timestamps without an offset as UTC"""
+    dt = datetime.datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt
+
+
+def format_epoch(epoch: float) -> str:
+    """Format epoch seconds the way DMI reports observation times"""
+    return datetime.datetime.fromtimestamp(epoch, tz=datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class ObservationSeries:
+    """Time-sorted observations of one parameter at one station, held as NumPy arrays"""
+
+    def __init__(self, times: np.ndarray, values: np.ndarray, qc_statuses: List[Optional[str]]):
+        """
+        Parameters:
+        - times: Observation times as epoch seconds, sorted ascending
+        - values: Observed values (NaN where DMI reported no value)
+        - qc_statuses: QC status of each observation
+        """
+        self.times = times
+        self.values = values
+        self.qc_statuses = qc_statuses
+
+    @classmethod
+    def from_features(cls, features: List[Dict[str, Any]]) -> "ObservationSeries":
+        """Build a series from DMI observation GeoJSON features"""
+        rows = []
+        for feature in features:
+            properties = feature.get("properties", {})
+            try:
+                epoch = parse_timestamp(properties.get("observed", "")).timestamp()
+            except ValueError:
+                continue
+            value = properties.get("value")
+            rows.append((epoch, np.nan if value is None else value, properties.get("qcStatus")))
+
+        rows.sort(key=lambda row: row[0])
+        return cls(
+            np.array([row[0] for row in rows], dtype=np.int64),
+            np.array([row[1] for row in rows], dtype=np.float64),
+            [row[2] for row in rows]
+        )
+
+    def __len__(self):
+        return len(self.times)
+
+    def closest(self, epoch: float, tolerance: float) -> Optional[int]:
+        """
+        Find the observation closest to a time with a binary search
+
+        Parameters:
+        - epoch: Time to look up in epoch seconds
+        - tolerance: Maximum allowed distance in seconds
+
+        Returns:
+        - Index of the closest observation or None if none is within the tolerance
+        """
+        if not len(self.times):
+            return None
+
+        index = int(np.searchsorted(self.times, epoch))
+        candidates = [i for i in (index - 1, index) if 0 <= i < len(self.times)]
+        best = min(candidates, key=lambda i: abs(self.times[i] - epoch))
+
+        if abs(self.times[best] - epoch) > tolerance:
+            return None
+        return best
+
+    def observation(self, index: int) -> Dict[str, Any]:
+        """Return the observed time, value and QC status at an index"""
+        value = self.values[index]
+        return {
+            "observed": format_epoch(self.times[index]),
+            "value": None if np.isnan(value) else float(value),
+            "qcStatus": self.qc_statuses[index]
+        }
@@ -0,0 +1,170 @@
+# app/services/observation_store.py
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.services.observation_series import ObservationSeries
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    station_id TEXT NOT NULL,
+    parameter_id TEXT NOT NULL,
+    observed INTEGER NOT NULL,
+    value REAL,
+    qc_status TEXT,
+    PRIMARY KEY (station_id, parameter_id, observed)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS ranges (
+    station_id TEXT NOT NULL,
+    parameter_id TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    qc_status TEXT NOT NULL,
+    fetched_at INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ranges_by_station ON ranges (station_id, parameter_id, start);
+"""
+
+# Status of a stored range whose observations will not change anymore
+QC_FINAL = "final"
+# Status of a stored range that DMI may still revise
+QC_PROVISIONAL = "provisional"
+# DMI qcStatus of observations that have been quality controlled ("none" until they are)
+QC_CHECKED_STATUSES = ("manual",)
+# Version of the store layout, recorded in PRAGMA user_version
+SCHEMA_VERSION = 1
+
+
+class ObservationStore:
+    """SQLite store of DMI observation series and the time ranges that have been fetched"""
+
+    def __init__(self, path: str, final_after: float = 30 * 24 * 3600):
+        """
+        Parameters:
+        - path: Path of the SQLite database file
+        - final_after: Age in seconds after which observations are considered final. Only ranges
+          that ended at least this long ago and whose observations DMI has all quality controlled
+          are served from the store; other ranges are refetched.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.final_after = final_after
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def missing_ranges(self, station_id: str, parameter_id: str, start: float, end: float) -> List[Tuple[int, int]]:
+        """
+        Get the parts of a time window that are not stored as final yet
+
+        Parameters:
+        - station_id: The ID of the DMI water level station
+        - parameter_id: The parameter ID
+        - start: Start of the window in epoch seconds
+        - end: End of the window in epoch seconds
+
+        Returns:
+        - Sorted list of (start, end) epoch second ranges that still need to be fetched
+        """
+        start, end = math.floor(start), math.ceil(end)
+        covered = self._connection().execute(
+            "SELECT start, end FROM ranges "
+            "WHERE station_id = ? AND parameter_id = ? AND qc_status = ? AND end >= ? AND start <= ? "
+            "ORDER BY start",
+            (station_id, parameter_id, QC_FINAL, start, end)
+        ).fetchall()
+
+        missing = []
+        cursor = start
+        for range_start, range_end in covered:
+            if range_start > cursor:
+                missing.append((cursor, range_start))
+            cursor = max(cursor, range_end)
+            if cursor >= end:
+                break
+        if cursor < end:
+            missing.append((cursor, end))
+        return missing
+
+    def load(self, station_id: str, parameter_id: str, start: float, end: float) -> ObservationSeries:
+        """Load the stored observations between two epoch second times"""
+        rows = self._connection().execute(
+            "SELECT observed, value, qc_status FROM observations "
+            "WHERE station_id = ? AND parameter_id = ? AND observed BETWEEN ? AND ? "
+            "ORDER BY observed",
+            (station_id, parameter_id, math.floor(start), math.ceil(end))
+        ).fetchall()
+
+        return ObservationSeries(
+            np.array([row[0] for row in rows], dtype=np.int64),
+            np.array([np.nan if row[1] is None else row[1] for row in rows], dtype=np.float64),
+            [row[2] for row in rows]
+        )
+
+    def load_stations(self, station_ids: List[str], parameter_id: str, start: float,
+                      end: float) -> List[Tuple[str, int, Optional[float], Optional[str]]]:
+        """Load the stored observations of several stations as (station_id, observed, value, qc_status) rows"""
+        placeholders = ",".join("?" * len(station_ids))
+        return self._connection().execute(
+            "SELECT station_id, observed, value, qc_status FROM observations "
+            f"WHERE station_id IN ({placeholders}) AND parameter_id = ? AND observed BETWEEN ? AND ?",
+            (*station_ids, parameter_id, math.floor(start), math.ceil(end))
+        ).fetchall()
+
+    def save(self, station_id: str, parameter_id: str, start: float, end: float, series: ObservationSeries):
+        """
+        Store the observations fetched for a time window and record the window as covered
+
+        Parameters:
+        - station_id: The ID of the DMI water level station
+        - parameter_id: The parameter ID
+        - start: Start of the fetched window in epoch seconds
+        - end: End of the fetched window in epoch seconds
+        - series: All observations DMI returned for the window
+        """
+        start, end = math.floor(start), math.ceil(end)
+        now = time.time()
+        checked = all(qc in QC_CHECKED_STATUSES for qc in series.qc_statuses)
+        qc_status = QC_FINAL if checked and end <= now - self.final_after else QC_PROVISIONAL
+
+        rows = [
+            (station_id, parameter_id, int(observed), None if np.isnan(value) else float(value), qc)
+            for observed, value, qc in zip(series.times, series.values, series.qc_statuses)
+        ]
+
+        with self._connection() as connection:
+            connection.executemany("INSERT OR REPLACE INTO observations VALUES (?, ?, ?, ?, ?)", rows)
+            # Provisional ranges inside the new window are superseded by it
+            connection.execute(
+                "DELETE FROM ranges WHERE station_id = ? AND parameter_id = ? AND qc_status = ? "
+                "AND start >= ? AND end <= ?",
+                (station_id, parameter_id, QC_PROVISIONAL, start, end)
+            )
+            connection.execute(
+                "INSERT INTO ranges VALUES (?, ?, ?, ?, ?, ?)",
+                (station_id, parameter_id, start, end, qc_status, int(now))
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the SQLite connection of the current thread, opening it on first use"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            # Let several gunicorn workers read while one of them writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
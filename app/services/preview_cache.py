@@ -0,0 +1,158 @@
+# app/services/preview_cache.py
+import hashlib
+import io
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Downscaling previews is optional
+    Image = None
+
+
+class PreviewCache:
+    """Size-capped on-disk LRU cache of preview images, shared by all workers through the file system"""
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Parameters:
+        - directory: Directory the cached images are stored in
+        - max_bytes: Total size of the cached images before the least recently used are removed
+        """
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Approximate size of the directory; recounted from disk whenever it exceeds the cap
+        self._size = None
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the path of a cached image, marking it as recently used, or None if it is not cached"""
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._misses += 1
+            return None
+
+        with self._lock:
+            self._hits += 1
+        return path
+
+    def put(self, key: str, data: bytes) -> str:
+        """Store an image and return its path"""
+        for _ in self.stream_into(key, [data]):
+            pass
+        return self._path(key)
+
+    def stream_into(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Pass chunks of an image through while writing them to the cache
+
+        The image is only added to the cache once every chunk has been written, so a
+        download that is interrupted never leaves a partial image behind.
+        """
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        size = 0
+        try:
+            with open(temp_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+                    yield chunk
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        self._added(size)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit and miss counts for monitoring"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else None
+            }
+
+    def _path(self, key: str) -> str:
+        """Return the file path of a cache key"""
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def _added(self, size: int):
+        """Account for a stored image and evict the least recently used ones above the size cap"""
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+                if self._size <= self.max_bytes:
+                    return
+
+        # Other workers write to the same directory, so the real size is read from disk
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, entry_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+                total -= entry_size
+            except OSError:
+                pass
+
+        with self._lock:
+            self._size = total
+
+
+def can_downscale() -> bool:
+    """Return whether previews can be downscaled, which requires Pillow"""
+    return Image is not None
+
+
+def content_type(path: str) -> str:
+    """Guess the content type of a cached image from its first bytes"""
+    with open(path, "rb") as f:
+        header = f.read(12)
+    if header.startswith(b"\x89PNG"):
+        return "image/png"
+    if header.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if header.startswith(b"GIF8"):
+        return "image/gif"
+    if header.startswith(b"RIFF") and header[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def downscale(path: str, max_edge: int) -> Tuple[bytes, str]:
+    """
+    Shrink an image so its longest edge is at most `max_edge` pixels (requires Pillow)
+
+    Returns:
+    - Tuple of (image bytes, content type); JPEG unless the image has transparency
+    """
+    with Image.open(path) as image:
+        image.thumbnail((max_edge, max_edge))
+        output = io.BytesIO()
+        if image.mode in ("RGBA", "LA", "P"):
+            image.save(output, format="PNG", optimize=True)
+            return output.getvalue(), "image/png"
+        image.convert("RGB").save(output, format="JPEG", quality=85)
+        return output.getvalue(), "image/jpeg"
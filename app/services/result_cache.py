@@ -0,0 +1,134 @@
+# app/services/result_cache.py
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import redis
+except ImportError:  # Shared caching is optional
+    redis = None
+
+
+class ResultCache:
+    """Size-capped LRU cache with per-entry TTL, optionally shared between workers through Redis"""
+
+    def __init__(self, name: str, max_entries: int = 256, redis_url: Optional[str] = None,
+                 encode: Callable[[Any], str] = json.dumps, decode: Callable[[str], Any] = json.loads):
+        """
+        Parameters:
+        - name: Name of the cache, used as key prefix in the shared backend and in statistics
+        - max_entries: Maximum number of entries kept in process before the least recently used is evicted
+        - redis_url: Optional Redis URL of a backend shared by all workers
+        - encode: Function serializing values for the shared backend
+        - decode: Function reading values serialized by `encode`
+        """
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.max_entries = max_entries
+        self.encode = encode
+        self.decode = decode
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._shared = None
+        if redis_url:
+            self.set_shared_backend(redis_url)
+
+    def set_max_entries(self, max_entries: int):
+        """Set the maximum number of in-process entries"""
+        with self._lock:
+            self.max_entries = max_entries
+            self._evict()
+
+    def set_shared_backend(self, redis_url: Optional[str]):
+        """Share entries between workers through Redis (requires the redis package)"""
+        if not redis_url:
+            self._shared = None
+        elif redis is None:
+            self.logger.warning(f"redis is not installed, the {self.name} cache is not shared between workers")
+        else:
+            self._shared = redis.Redis.from_url(redis_url)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for a key or None if it is missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        value = self._get_shared(key)
+        with self._lock:
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        """Store a value for `ttl` seconds"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            self._evict()
+        self._set_shared(key, value, ttl)
+
+    def clear(self):
+        """Remove all in-process entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit and miss counts for monitoring"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else None,
+                "shared": self._shared is not None
+            }
+
+    def _evict(self):
+        """Drop least recently used entries above the size cap (caller holds the lock)"""
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_shared(self, key: str) -> Optional[Any]:
+        """Read a value from the shared backend and keep a local copy"""
+        if self._shared is None:
+            return None
+        try:
+            raw = self._shared.get(f"shore:{self.name}:{key}")
+            if raw is None:
+                return None
+            ttl = self._shared.ttl(f"shore:{self.name}:{key}")
+            value = self.decode(raw)
+        except Exception as e:
+            self.logger.warning(f"Error reading shared {self.name} cache: {str(e)}")
+            return None
+
+        if ttl and ttl > 0:
+            with self._lock:
+                self._entries[key] = (time.monotonic() + ttl, value)
+                self._evict()
+        return value
+
+    def _set_shared(self, key: str, value: Any, ttl: float):
+        """Write a value to the shared backend"""
+        if self._shared is None:
+            return
+        try:
+            self._shared.set(f"shore:{self.name}:{key}", self.encode(value), ex=max(1, int(ttl)))
+        except Exception as e:
+            self.logger.warning(f"Error writing shared {self.name} cache: {str(e)}")
@@ -0,0 +1,97 @@
+# app/services/sentinel2_tiles.py
+import math
+import re
+from typing import Optional, Tuple
+
+# WGS84 ellipsoid and UTM scale factor
+_A = 6378137.0
+_F = 1 / 298.257223563
+_E2 = _F * (2 - _F)
+_EP2 = _E2 / (1 - _E2)
+_K0 = 0.9996
+
+# MGRS letters: latitude bands from 80°S in 8° steps, 100 km columns per zone set and rows
+_BANDS = "CDEFGHJKLMNPQRSTUVWX"
+_COLUMN_SETS = ("ABCDEFGH", "JKLMNPQR", "STUVWXYZ")
+_ROWS = "ABCDEFGHJKLMNPQRSTUV"
+
+# Sentinel-2 tiles extend 109.8 km east and south from the north-west corner of their MGRS square
+TILE_SIZE = 109800
+
+# A tile ID as in s2:tile_id ("32UNG"), optionally prefixed with T or embedded in a granule ID
+_TILE_ID = re.compile(r"(?<![0-9A-Z])T?(\d{1,2})([C-HJ-NP-X])([A-HJ-NP-Z])([A-HJ-NP-V])(?![0-9A-Z])")
+
+
+def tile_center(tile_id: Optional[str]) -> Optional[Tuple[float, float]]:
+    """
+    Compute the centre of a Sentinel-2 tile from its MGRS tile ID
+
+    Parameters:
+    - tile_id: Tile ID such as "32UNG" or "T32UNG", or a granule ID containing one
+
+    Returns:
+    - Tuple of (lon, lat), or None if the ID is not a valid tile ID
+    """
+    match = _TILE_ID.search(tile_id or "")
+    if not match:
+        return None
+    zone, band, column, row = int(match.group(1)), match.group(2), match.group(3), match.group(4)
+    column_set = _COLUMN_SETS[(zone - 1) % 3]
+    if not 1 <= zone <= 60 or column not in column_set:
+        return None
+
+    easting = (column_set.index(column) + 1) * 100000 + TILE_SIZE / 2
+    # Row letters repeat every 2000 km, and start 5 letters later in even zones
+    row_northing = ((_ROWS.index(row) - (5 if zone % 2 == 0 else 0)) % 20) * 100000
+    band_south = -80 + 8 * _BANDS.index(band)
+    northern = band >= "N"
+
+    # Pick the repetition of the row that falls in the latitude band (bands X and the
+    # squares straddling band edges are allowed some slack)
+    for cycle in range(5):
+        northing = row_northing + cycle * 2000000 + 100000 - TILE_SIZE / 2
+        lon, lat = utm_to_lonlat(zone, easting, northing, northern)
+        if band_south - 1 <= lat <= band_south + (12 if band == "X" else 8) + 1:
+            return lon, lat
+    return None
+
+
+def utm_to_lonlat(zone: int, easting: float, northing: float, northern: bool = True) -> Tuple[float, float]:
+    """
+    Convert UTM coordinates on WGS84 to longitude and latitude
+
+    Parameters:
+    - zone: UTM zone number (1-60)
+    - easting: Easting in metres, including the 500 km false easting
+    - northing: Northing in metres, including the 10000 km false northing in the southern hemisphere
+    - northern: Whether the coordinates are in the northern hemisphere
+
+    Returns:
+    - Tuple of (lon, lat) in degrees
+    """
+    x = easting - 500000
+    y = northing if northern else northing - 10000000
+
+    # Footpoint latitude from the meridian arc length
+    mu = y / _K0 / (_A * (1 - _E2 / 4 - 3 * _E2 ** 2 / 64 - 5 * _E2 ** 3 / 256))
+    e1 = (1 - math.sqrt(1 - _E2)) / (1 + math.sqrt(1 - _E2))
+    phi = (mu + (3 * e1 / 2 - 27 * e1 ** 3 / 32) * math.sin(2 * mu)
+           + (21 * e1 ** 2 / 16 - 55 * e1 ** 4 / 32) * math.sin(4 * mu)
+           + (151 * e1 ** 3 / 96) * math.sin(6 * mu)
+           + (1097 * e1 ** 4 / 512) * math.sin(8 * mu))
+
+    sin_phi, cos_phi, tan_phi = math.sin(phi), math.cos(phi), math.tan(phi)
+    c = _EP2 * cos_phi ** 2
+    t = tan_phi ** 2
+    n = _A / math.sqrt(1 - _E2 * sin_phi ** 2)
+    r = _A * (1 - _E2) / (1 - _E2 * sin_phi ** 2) ** 1.5
+    d = x / (n * _K0)
+
+    lat = phi - (n * tan_phi / r) * (
+        d ** 2 / 2
+        - (5 + 3 * t + 10 * c - 4 * c ** 2 - 9 * _EP2) * d ** 4 / 24
+        + (61 + 90 * t + 298 * c + 45 * t ** 2 - 252 * _EP2 - 3 * c ** 2) * d ** 6 / 720)
+    lon = (d - (1 + 2 * t + c) * d ** 3 / 6
+           + (5 - 2 * c + 28 * t - 3 * c ** 2 + 8 * _EP2 + 24 * t ** 2) * d ** 5 / 120) / cos_phi
+
+    return zone * 6 - 183 + math.degrees(lon), math.degrees(lat)
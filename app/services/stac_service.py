@@ -1,25 +1,152 @@
 # app/services/stac_service.py
+import base64
 import datetime
+import hashlib
+import hmac
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
 from shapely.geometry import shape
 
+from app.services import json_backend, metrics
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.http_client import HttpClient
+from app.services.image_record import ImageRecord, cache_dumps, loads
+from app.services.result_cache import ResultCache
+
+# Maximum number of item IDs resolved by one STAC ids search
+ITEM_IDS_PER_SEARCH = 100
+
 
 class STACService:
     """Service for interacting with Copernicus STAC API for satellite data access"""
 
+    # GET searches are tried first; the STAC API implementation may have issues with CQL2 over POST
+    DEFAULT_SEARCH_METHOD = "GET"
+
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.stac_base_url = "https://catalogue.dataspace.copernicus.eu/stac"
         self.water_level_service = None  # Will be set from the main view
+        self.http = HttpClient("stac", timeout=(5, 60))
+        self.search_cache = ResultCache("search", encode=cache_dumps, decode=loads)
+        self.search_cache_recent_ttl = 300
+        self.search_cache_historic_ttl = 7 * 24 * 3600
+        self.search_cache_bbox_tolerance = 0.001
+        # Whether the STAC API applies CQL2 cloud filters on GET searches (None until known)
+        self.upstream_cloud_filter = None
+        self._refill_cursors = ResultCache("refill_cursors", max_entries=1024)
+        # Upstream pages scanned at most per request when refilling cloud-filtered pages
+        self.refill_max_pages = 10
+        # Assets of published STAC items never change, so they are kept for a long time
+        self.item_asset_cache = ResultCache("item_assets", max_entries=4096)
+        self.item_asset_ttl = 30 * 24 * 3600
+        # On-disk cache of proxied preview images (set from the main view)
+        self.preview_cache = None
+        # Search pages returned without water levels, by enrichment token. Tokens are signed and
+        # carry their search, so other workers can serve them without this cache. They depend on
+        # the search only, so repeated searches return identical bodies (and ETags).
+        self.enrichment_tokens = ResultCache("enrichment_tokens", max_entries=512, encode=cache_dumps, decode=loads)
+        self.enrichment_token_ttl = 900
+        self.enrichment_token_secret = b""
+
+        # Search methods in order of preference, with a circuit breaker per method
+        self.search_methods = {"GET": self.search_with_get, "POST": self.search_with_post}
+        self.search_breakers = {method: CircuitBreaker(f"stac-{method.lower()}") for method in self.search_methods}
+        self.preferred_search_method = self.DEFAULT_SEARCH_METHOD
+        self.probe_interval = 60
+        self._probe_lock = threading.Lock()
+        self._probing = False
+        self._last_probe = 0.0
+
+        # Thread pool for concurrent item fetches
+        self.max_workers = 8
+        self._executor = None
 
     def set_water_level_service(self, water_level_service):
         """Set the water level service for fetching water level data"""
         self.water_level_service = water_level_service
 
+    def set_preview_cache(self, preview_cache):
+        """Set the on-disk cache that proxied preview images are stored in"""
+        self.preview_cache = preview_cache
+
+    def set_refill_max_pages(self, max_pages):
+        """Set the maximum number of upstream pages scanned per request when refilling cloud-filtered pages"""
+        self.refill_max_pages = max(1, max_pages)
+
+    def configure_search_cache(self, max_entries=None, recent_ttl=None, historic_ttl=None,
+                               bbox_tolerance=None, redis_url=None):
+        """
+        Configure the search result cache
+
+        Parameters:
+        - max_entries: Maximum number of searches kept in process
+        - recent_ttl: Seconds to keep searches whose date range includes today
+        - historic_ttl: Seconds to keep searches over purely historical date ranges
+        - bbox_tolerance: Degrees the bbox is rounded to when building cache keys
+        - redis_url: Optional Redis URL to share cached searches between workers
+        """
+        if max_entries is not None:
+            self.search_cache.set_max_entries(max_entries)
+        if recent_ttl is not None:
+            self.search_cache_recent_ttl = recent_ttl
+        if historic_ttl is not None:
+            self.search_cache_historic_ttl = historic_ttl
+        if bbox_tolerance:
+            self.search_cache_bbox_tolerance = bbox_tolerance
+        self.search_cache.set_shared_backend(redis_url)
+        self.enrichment_tokens.set_shared_backend(redis_url)
+
+    def configure_enrichment_tokens(self, secret_key, ttl=None):
+        """
+        Configure the tokens returned with searches made without water levels
+
+        Parameters:
+        - secret_key: Key the tokens are signed with; must be the same for all workers
+        - ttl: Seconds the page of a token is kept by the worker that issued it
+        """
+        self.enrichment_token_secret = str(secret_key or "").encode()
+        if ttl is not None:
+            self.enrichment_token_ttl = ttl
+
+    def configure_item_asset_cache(self, max_entries=None, ttl=None, redis_url=None):
+        """
+        Configure the cache of STAC item assets used for download links
+
+        Parameters:
+        - max_entries: Maximum number of items kept in process
+        - ttl: Seconds to keep the assets of an item
+        - redis_url: Optional Redis URL to share cached assets between workers
+        """
+        if max_entries is not None:
+            self.item_asset_cache.set_max_entries(max_entries)
+        if ttl is not None:
+            self.item_asset_ttl = ttl
+        self.item_asset_cache.set_shared_backend(redis_url)
+
+    def configure_search_fallback(self, failure_threshold=None, reset_timeout=None, probe_interval=None):
+        """
+        Configure when a failing search method is skipped and how often it is re-probed
+
+        Parameters:
+        - failure_threshold: Consecutive failures after which a method is skipped
+        - reset_timeout: Seconds before a skipped method is tried again by regular searches
+        - probe_interval: Seconds between background probes of the default method
+        """
+        for breaker in self.search_breakers.values():
+            if failure_threshold is not None:
+                breaker.failure_threshold = failure_threshold
+            if reset_timeout is not None:
+                breaker.reset_timeout = reset_timeout
+        if probe_interval is not None:
+            self.probe_interval = probe_interval
+
     def search_images(self, geometry, start_date=None, end_date=None, max_cloud_coverage=20,
-                      page=1, limit=20, sort_by=None, sort_direction='desc'):
+                      page=1, limit=20, sort_by=None, sort_direction='desc', enrich=True, enrichment_token=True):
         """
         Search for Sentinel-2 images based on geographic area and time range with pagination
 
@@ -32,28 +159,20 @@ class STACService:
         - limit: Number of results per page (max 1000 per STAC API docs)
         - sort_by: Field to sort by (e.g. 'datetime')
         - sort_direction: Sort direction ('asc' or 'desc')
+        - enrich: Attach water level data before returning. When False the images are returned
+          right away together with an `enrichment_token` for enrich_search_page.
+        - enrichment_token: Whether pages returned without water levels get an enrichment token;
+          callers enriching the images themselves skip it
 
         Returns:
         - Dictionary with results and pagination metadata
         """
         try:
             # Set default dates if not provided
-            if not start_date:
-                start_date = (datetime.datetime.now() - datetime.timedelta(days=15)).strftime("%Y-%m-%d")
-            elif isinstance(start_date, datetime.datetime):
-                start_date = start_date.strftime("%Y-%m-%d")
-
-            if not end_date:
-                end_date = datetime.datetime.now().strftime("%Y-%m-%d")
-            elif isinstance(end_date, datetime.datetime):
-                end_date = end_date.strftime("%Y-%m-%d")
-
-            # Format the datetime for STAC API
-            datetime_query = f"{start_date}T00:00:00Z/{end_date}T23:59:59Z"
+            start_date, end_date = self._normalize_dates(start_date, end_date)
 
-            # Get the bounding box from the geometry for bbox query
-            geom_shape = shape(geometry)
-            bbox = geom_shape.bounds  # (minx, miny, maxx, maxy)
+            # Get the bounding box from the geometry for the cache key
+            bbox = shape(geometry).bounds  # (minx, miny, maxx, maxy)
 
             # Ensure page number is valid
             if page < 1:
@@ -65,20 +184,201 @@ class STACService:
             elif limit > 1000:
                 limit = 1000
 
-            # Try first with simple GET request (more reliable)
+            # Serve repeated searches (paging back, re-sorting, exporting) from the cache
+            cache_key = self._search_cache_key(bbox, start_date, end_date, max_cloud_coverage,
+                                               page, limit, sort_by, sort_direction)
+            cached = self.search_cache.get(cache_key)
+            if cached is not None:
+                self.logger.info(f"Serving search results from cache: {cache_key}")
+                return cached
+
+            result = self._search_with_fallback(
+                geometry, start_date, end_date, max_cloud_coverage, page, limit, sort_by, sort_direction, enrich)
+
+            if not enrich:
+                # The page is cached once its water levels have been fetched
+                if not enrichment_token:
+                    return result
+                token = self._create_enrichment_token({
+                    "bbox": list(bbox), "start_date": start_date, "end_date": end_date,
+                    "max_cloud_coverage": max_cloud_coverage, "page": page, "limit": limit,
+                    "sort_by": sort_by, "sort_direction": sort_direction
+                })
+                self.enrichment_tokens.set(token, result, self.enrichment_token_ttl)
+                return dict(result, enrichment_token=token)
+
+            self.search_cache.set(cache_key, result, self._search_cache_ttl(end_date))
+            return result
+
+        except Exception as e:
+            self.logger.error(f"Error searching for images: {str(e)}")
+            # The details stay in the log; clients only learn that the search failed
+            return {"images": [], "error": "Search failed, please try again later",
+                    "pagination": {"page": page, "limit": limit, "total": 0, "next": False, "prev": False}}
+
+    def enrich_search_page(self, token):
+        """
+        Fetch the water level data for a page returned by search_images with enrich=False
+
+        Parameters:
+        - token: The enrichment token returned with the page
+
+        The page is taken from the worker's token cache. Tokens issued by another worker carry
+        their search, which is run again here.
+
+        Returns:
+        - Dictionary mapping image ID to its waterLevel block, or None if the token is invalid
+        """
+        search = self._read_enrichment_token(token)
+        if search is None:
+            return None
+
+        bbox = search.pop("bbox")
+        cache_key = self._search_cache_key(bbox, search["start_date"], search["end_date"],
+                                           search["max_cloud_coverage"], search["page"], search["limit"],
+                                           search["sort_by"], search["sort_direction"])
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            # Already enriched for an earlier request
+            return {image.id: image.water_level for image in cached["images"]}
+
+        result = self.enrichment_tokens.get(token)
+        if result is None:
+            self.logger.info("Enrichment token issued by another worker, running its search again")
+            geometry = {"type": "Polygon", "coordinates": [[
+                [bbox[0], bbox[1]], [bbox[2], bbox[1]], [bbox[2], bbox[3]], [bbox[0], bbox[3]], [bbox[0], bbox[1]]
+            ]]}
             try:
-                return self.search_with_get(
-                    geometry,
-                    start_date,
-                    end_date,
-                    max_cloud_coverage,
-                    page,
-                    limit,
-                    sort_by,
-                    sort_direction
-                )
+                result = self._search_with_fallback(
+                    geometry, search["start_date"], search["end_date"], search["max_cloud_coverage"],
+                    search["page"], search["limit"], search["sort_by"], search["sort_direction"], False)
             except Exception as e:
-                self.logger.warning(f"GET request failed, trying POST: {str(e)}")
+                self.logger.error(f"Error searching for images to enrich: {str(e)}")
+                return {}
+
+        images = [image.copy() for image in result["images"]]
+        self._enrich_with_water_levels(images)
+
+        # Later identical searches get the enriched page straight from the cache
+        self.search_cache.set(cache_key, dict(result, images=images), self._search_cache_ttl(search["end_date"]))
+
+        return {image.id: image.water_level for image in images}
+
+    def _create_enrichment_token(self, search):
+        """Sign a search into a URL-safe enrichment token, the same for every identical search"""
+        payload = base64.urlsafe_b64encode(json_backend.dumps(search).encode()).rstrip(b"=")
+        return f"{payload.decode()}.{self._sign_enrichment_token(payload)}"
+
+    def _read_enrichment_token(self, token):
+        """Return the search signed into an enrichment token, or None if the token is invalid"""
+        payload, _, signature = str(token).encode().partition(b".")
+        if not hmac.compare_digest(signature.decode(errors="replace"), self._sign_enrichment_token(payload)):
+            return None
+        try:
+            return json_backend.loads(base64.urlsafe_b64decode(payload + b"=" * (-len(payload) % 4)))
+        except ValueError:
+            return None
+
+    def _sign_enrichment_token(self, payload):
+        """Return the signature of an enrichment token payload"""
+        digest = hmac.new(self.enrichment_token_secret, payload, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:18]).decode()
+
+    def iter_search_pages(self, geometry, start_date=None, end_date=None, max_cloud_coverage=20,
+                          sort_by=None, sort_direction='desc', limit=1000):
+        """
+        Iterate over all pages of a search, following the STAC next links
+
+        Each page is enriched with water level data as it arrives and yielded before the
+        next one is requested, so only one page is held in memory at a time.
+
+        Parameters:
+        - geometry: GeoJSON geometry object defining the area of interest
+        - start_date: Start date for the search (defaults to 15 days ago)
+        - end_date: End date for the search (defaults to today)
+        - max_cloud_coverage: Maximum cloud coverage percentage
+        - sort_by: Field to sort by (e.g. 'datetime')
+        - sort_direction: Sort direction ('asc' or 'desc')
+        - limit: Number of results requested per upstream page
+
+        Yields:
+        - Lists of processed image dictionaries, one per page
+        """
+        for result in self.iter_search_results(geometry, start_date, end_date, max_cloud_coverage,
+                                               sort_by, sort_direction, limit):
+            yield result["images"]
+
+    def iter_search_results(self, geometry, start_date=None, end_date=None, max_cloud_coverage=20,
+                            sort_by=None, sort_direction='desc', limit=1000, enrich=True):
+        """
+        Iterate over all pages of a search like iter_search_pages, yielding the full page results
+
+        Parameters are the same as for iter_search_pages, plus:
+        - enrich: Attach water level data to each page before yielding it
+
+        Yields:
+        - Dictionaries with the images and pagination metadata of each page
+        """
+        search_args = dict(start_date=start_date, end_date=end_date, max_cloud_coverage=max_cloud_coverage,
+                           limit=limit, sort_by=sort_by, sort_direction=sort_direction, enrich=enrich,
+                           enrichment_token=False)
+        page = 1
+        result = self.search_images(geometry, page=page, **search_args)
+
+        while True:
+            yield result
+
+            pagination = result["pagination"]
+            if not pagination.get("next"):
+                return
+
+            if pagination.get("next_link"):
+                try:
+                    stac_response = self._fetch_next_page(pagination)
+                except Exception as e:
+                    self.logger.error(f"Error fetching next search page: {str(e)}")
+                    return
+
+                if not stac_response.get("features"):
+                    return
+                result = self._build_search_result(stac_response, max_cloud_coverage, page + 1, limit, enrich,
+                                                   request_body=pagination.get("next_body"))
+            else:
+                # Pages refilled after client-side cloud filtering have no upstream link to follow
+                result = self.search_images(geometry, page=page + 1, **search_args)
+            page += 1
+
+    def _fetch_next_page(self, pagination):
+        """
+        Request the page a STAC next link points to
+
+        Next links of POST searches carry the method and the body to send, which hold the
+        bbox, dates and filters of the search; they are replayed as they are.
+        """
+        self.logger.info(f"Following STAC next link: {pagination['next_link']}")
+        if pagination.get("next_method") == "POST":
+            response = self.http.post(pagination["next_link"], json=pagination.get("next_body") or {})
+        else:
+            response = self.http.get(pagination["next_link"])
+        response.raise_for_status()
+        return json_backend.loads_search_page(response.content)
+
+    def search_with_post(self, geometry, start_date=None, end_date=None, max_cloud_coverage=20,
+                         page=1, limit=20, sort_by=None, sort_direction='desc', enrich=True):
+        """
+        Search method using a POST request to the STAC /search endpoint
+        The cloud coverage filter is sent with the STAC query extension
+        """
+        try:
+            # Set default dates if not provided
+            start_date, end_date = self._normalize_dates(start_date, end_date)
+
+            # Format the datetime for STAC API
+            datetime_query = f"{start_date}T00:00:00Z/{end_date}T23:59:59Z"
+
+            # Get the bounding box from the geometry for bbox query
+            geom_shape = shape(geometry)
+            bbox = geom_shape.bounds  # (minx, miny, maxx, maxy)
 
             # Build filter object for POST request
             filter_obj = {
@@ -104,83 +404,282 @@ class STACService:
 
             # Make the request using POST
             self.logger.info(f"Searching STAC API with filter: {filter_obj}")
-            response = requests.post(f"{self.stac_base_url}/search", json=filter_obj)
+            response = self.http.post(f"{self.stac_base_url}/search", json=filter_obj)
             response.raise_for_status()
 
-            # Parse the response
-            stac_response = response.json()
+            # Parse the response and process the images
+            stac_response = json_backend.loads_search_page(response.content)
+            return self._build_search_result(stac_response, max_cloud_coverage, page, limit, enrich,
+                                             request_body=filter_obj)
 
-            # Extract pagination links if available
-            next_link = None
-            prev_link = None
+        except Exception as e:
+            self.logger.error(f"Error searching for images with POST: {str(e)}")
+            raise e
 
-            for link in stac_response.get("links", []):
-                if link.get("rel") == "next":
-                    next_link = link.get("href")
-                elif link.get("rel") == "prev":
-                    prev_link = link.get("href")
+    def _search_with_fallback(self, *search_args):
+        """
+        Search with the method that last succeeded, falling back to the other one
 
-            # Process images
-            images = self._process_stac_response(stac_response)
+        Methods whose circuit is open are skipped, so a failing method does not cost a full
+        round trip on every search. The default method (GET) is re-probed in the background
+        while searches are going through POST.
+        """
+        self._maybe_probe_default_method()
 
-            # Return results with pagination info
-            return {
-                "images": images,
-                "pagination": {
-                    "page": page,
-                    "limit": limit,
-                    "total": stac_response.get("context", {}).get("matched") or len(images),
-                    "next": next_link is not None,
-                    "prev": prev_link is not None,
-                    "next_link": next_link,
-                    "prev_link": prev_link
-                }
-            }
+        preferred = self.preferred_search_method
+        methods = [preferred] + [method for method in self.search_methods if method != preferred]
+        allowed = [method for method in methods if self.search_breakers[method].allow_request()]
 
-        except Exception as e:
-            self.logger.error(f"Error searching for images: {str(e)}")
-            return {"images": [],
-                    "pagination": {"page": page, "limit": limit, "total": 0, "next": False, "prev": False}}
+        last_error = None
+        for method in allowed or methods[:1]:
+            breaker = self.search_breakers[method]
+            try:
+                result = self.search_methods[method](*search_args)
+            except Exception as e:
+                # Client errors come from the query, not from the method being down
+                if self._is_upstream_failure(e):
+                    breaker.record_failure(e)
+                self.logger.warning(f"{method} search failed: {str(e)}")
+                last_error = e
+                continue
+
+            breaker.record_success()
+            if method != self.preferred_search_method:
+                self.logger.info(f"Switching preferred STAC search method to {method}")
+                self.preferred_search_method = method
+            return result
+
+        raise last_error
+
+    def _maybe_probe_default_method(self):
+        """Re-probe the default search method in the background when searches use the fallback"""
+        default = self.DEFAULT_SEARCH_METHOD
+        if self.preferred_search_method == default:
+            return
 
-    def get_image_details(self, image_id):
+        now = time.monotonic()
+        with self._probe_lock:
+            if self._probing or now - self._last_probe < self.probe_interval:
+                return
+            self._probing = True
+            self._last_probe = now
+
+        def probe():
+            breaker = self.search_breakers[default]
+            try:
+                self._probe_search_method(default)
+            except Exception as e:
+                if self._is_upstream_failure(e):
+                    breaker.record_failure(e)
+                self.logger.info(f"Probe of {default} search failed: {str(e)}")
+            else:
+                breaker.record_success()
+                self.logger.info(f"Probe of {default} search succeeded, switching back to it")
+                self.preferred_search_method = default
+            finally:
+                self._probing = False
+
+        threading.Thread(target=probe, name="stac-search-probe", daemon=True).start()
+
+    @staticmethod
+    def _is_upstream_failure(error):
+        """Return whether a search error counts against its method: timeouts, connection errors and 5xx"""
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return True
+        response = getattr(error, "response", None)
+        return isinstance(error, requests.HTTPError) and response is not None and response.status_code >= 500
+
+    def _probe_search_method(self, method):
+        """Send the smallest possible search with the given method, raising on failure"""
+        if method == "GET":
+            response = self.http.get(f"{self.stac_base_url}/collections/SENTINEL-2/items", params={"limit": 1})
+        else:
+            response = self.http.post(f"{self.stac_base_url}/search",
+                                      json={"collections": ["SENTINEL-2"], "limit": 1})
+        response.raise_for_status()
+
+    def get_search_method_stats(self):
+        """Return the preferred search method and the circuit state of each method"""
+        return {
+            "preferred": self.preferred_search_method,
+            "methods": {method: breaker.get_stats() for method, breaker in self.search_breakers.items()}
+        }
+
+    def _normalize_dates(self, start_date, end_date):
+        """Default the search window to the last 15 days and format dates as YYYY-MM-DD"""
+        if not start_date:
+            start_date = (datetime.datetime.now() - datetime.timedelta(days=15)).strftime("%Y-%m-%d")
+        elif isinstance(start_date, datetime.datetime):
+            start_date = start_date.strftime("%Y-%m-%d")
+
+        if not end_date:
+            end_date = datetime.datetime.now().strftime("%Y-%m-%d")
+        elif isinstance(end_date, datetime.datetime):
+            end_date = end_date.strftime("%Y-%m-%d")
+
+        return start_date, end_date
+
+    def _search_cache_key(self, bbox, start_date, end_date, max_cloud_coverage, page, limit, sort_by, sort_direction):
+        """Build a normalized cache key for a search, with the bbox snapped to the cache tolerance"""
+        tolerance = self.search_cache_bbox_tolerance
+        rounded_bbox = ",".join(f"{round(value / tolerance) * tolerance:.6f}" for value in bbox)
+        return "|".join(str(part) for part in (
+            rounded_bbox, start_date, end_date, max_cloud_coverage,
+            sort_by or "", (sort_direction or "").lower(), page, limit
+        ))
+
+    def get_search_max_age(self, end_date=None):
+        """Return how many seconds the results of a search ending on `end_date` may be cached"""
+        _, end_date = self._normalize_dates(None, end_date)
+        return self._search_cache_ttl(end_date)
+
+    def _search_cache_ttl(self, end_date):
+        """Short TTL for windows reaching today (new acquisitions may appear), long TTL otherwise"""
+        today = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
+        if str(end_date)[:10] >= today:
+            return self.search_cache_recent_ttl
+        return self.search_cache_historic_ttl
+
+    def get_image_details(self, image_id, enrich=True):
         """
         Get detailed information about a specific image
 
         Parameters:
         - image_id: ID of the image
+        - enrich: Attach water level data to the image properties
 
         Returns:
         - Dictionary with image details
         """
         try:
-            # STAC items are identified by their full name with .SAFE extension
-            if not image_id.endswith(".SAFE"):
-                full_id = f"{image_id}.SAFE"
-            else:
-                full_id = image_id
+            image_details = self._fetch_item(self._full_item_id(image_id))
 
-            # Search for the specific image by ID in the SENTINEL-2 collection
-            url = f"{self.stac_base_url}/collections/SENTINEL-2/items/{full_id}"
-            self.logger.info(f"Fetching image details from: {url}")
+            # Add water level data if water level service is available
+            if enrich and self.water_level_service:
+                self._add_water_level_data([image_details])
 
-            response = requests.get(url)
-            response.raise_for_status()
+            return image_details
+
+        except Exception as e:
+            self.logger.error(f"Error getting image details: {str(e)}")
+            return {}
 
-            image_details = response.json()
+    def get_images_details(self, image_ids, enrich=True):
+        """
+        Get detailed information about many images at once
 
-            # Add water level data if water level service is available
-            if self.water_level_service:
+        The items are resolved with `ids` searches on the STAC /search endpoint, and items the
+        search does not return are fetched individually and concurrently. Water level data is
+        then added to all of them in one batched pass.
+
+        Parameters:
+        - image_ids: List of image IDs
+        - enrich: Attach water level data to the image properties
+
+        Returns:
+        - Dictionary mapping each requested image ID to its details (empty if it was not found)
+        """
+        full_ids = {image_id: self._full_item_id(image_id) for image_id in image_ids}
+        items = {}
+
+        unique_ids = list(dict.fromkeys(full_ids.values()))
+        for start in range(0, len(unique_ids), ITEM_IDS_PER_SEARCH):
+            items.update(self._search_items_by_id(unique_ids[start:start + ITEM_IDS_PER_SEARCH]))
+
+        missing = [full_id for full_id in unique_ids if full_id not in items]
+        if missing:
+            self.logger.info(f"Fetching {len(missing)} image details individually")
+            executor = self._get_executor()
+            futures = {executor.submit(metrics.in_current_context(self._fetch_item), full_id): full_id
+                       for full_id in missing}
+            for future in as_completed(futures):
                 try:
-                    self._add_water_level_data(image_details)
-                except Exception as water_level_err:
-                    self.logger.error(f"Error adding water level data: {str(water_level_err)}")
+                    items[futures[future]] = future.result()
+                except Exception as e:
+                    self.logger.error(f"Error getting image details for {futures[future]}: {str(e)}")
 
-            return image_details
+        if enrich and self.water_level_service:
+            self._add_water_level_data(list(items.values()))
 
+        return {image_id: items.get(full_id, {}) for image_id, full_id in full_ids.items()}
+
+    def _search_items_by_id(self, full_ids):
+        """Find STAC items with one `ids` search, returning a dictionary of the items found by ID"""
+        params = {"collections": "SENTINEL-2", "ids": ",".join(full_ids), "limit": len(full_ids)}
+        try:
+            response = self.http.get(f"{self.stac_base_url}/search", params=params)
+            response.raise_for_status()
+            features = json_backend.loads(response.content).get("features", [])
         except Exception as e:
-            self.logger.error(f"Error getting image details: {str(e)}")
+            self.logger.warning(f"STAC ids search failed, fetching items individually: {str(e)}")
             return {}
 
+        wanted = set(full_ids)
+        items = {feature["id"]: feature for feature in features if feature.get("id") in wanted}
+        for full_id, item in items.items():
+            self._cache_item_assets(full_id, item)
+        return items
+
+    def _fetch_item(self, full_id):
+        """Fetch a single STAC item from the SENTINEL-2 collection"""
+        url = f"{self.stac_base_url}/collections/SENTINEL-2/items/{full_id}"
+        self.logger.info(f"Fetching image details from: {url}")
+
+        response = self.http.get(url)
+        response.raise_for_status()
+        item = json_backend.loads(response.content)
+        self._cache_item_assets(full_id, item)
+        return item
+
+    def _cache_item_assets(self, full_id, item):
+        """Remember the assets of a fetched item for later download link requests"""
+        if item.get("assets"):
+            self.item_asset_cache.set(full_id, item["assets"], self.item_asset_ttl)
+
+    def get_items_assets(self, image_ids):
+        """
+        Get the assets of many images, from the item asset cache where possible
+
+        Parameters:
+        - image_ids: List of image IDs
+
+        Returns:
+        - Dictionary mapping each image ID to its assets (empty if the item was not found)
+        """
+        full_ids = {image_id: self._full_item_id(image_id) for image_id in image_ids}
+        assets = {}
+        for full_id in set(full_ids.values()):
+            cached = self.item_asset_cache.get(full_id)
+            if cached is not None:
+                assets[full_id] = cached
+
+        missing = [image_id for image_id, full_id in full_ids.items() if full_id not in assets]
+        if missing:
+            # Water levels are not needed for the assets
+            for image_id, image_details in self.get_images_details(missing, enrich=False).items():
+                assets[full_ids[image_id]] = image_details.get("assets", {})
+
+        return {image_id: assets.get(full_id, {}) for image_id, full_id in full_ids.items()}
+
+    @staticmethod
+    def _full_item_id(image_id):
+        """STAC items are identified by their full name with .SAFE extension"""
+        return image_id if image_id.endswith(".SAFE") else f"{image_id}.SAFE"
+
+    def _get_executor(self):
+        """Return the thread pool used for concurrent item fetches, creating it on first use"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, self.max_workers), thread_name_prefix="stac-item")
+        return self._executor
+
+    def set_max_workers(self, max_workers):
+        """Set the maximum number of concurrent item fetches"""
+        if max_workers != self.max_workers:
+            self.max_workers = max_workers
+            if self._executor:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
     def get_download_links(self, image_id, bands=None):
         """
         Get download links for a specific Sentinel image
@@ -192,32 +691,59 @@ class STACService:
         Returns:
         - Dictionary with download links
         """
-        if not bands:
-            bands = ["B04", "B03", "B02"]  # Default to RGB
-
         try:
-            # Get the full image details
-            image_details = self.get_image_details(image_id)
-            assets = image_details.get("assets", {})
-
-            # Collect download links for each requested band
-            download_links = {}
-            for band in bands:
-                if band in assets:
-                    download_links[band] = assets[band].get("href")
-
-            # If we couldn't find direct band links, look for a data link
-            if not download_links and "data" in assets:
-                download_links["data"] = assets["data"].get("href")
-
-            return download_links
+            return self._download_links(self.get_items_assets([image_id])[image_id], bands)
 
         except Exception as e:
             self.logger.error(f"Error getting download links: {str(e)}")
             return {}
 
+    def get_download_links_batch(self, image_ids, bands=None):
+        """
+        Get download links for many Sentinel images at once
+
+        Parameters:
+        - image_ids: List of image IDs
+        - bands: List of bands to download (defaults to RGB)
+
+        Returns:
+        - Dictionary mapping each image ID to its download links
+        """
+        assets = self.get_items_assets(image_ids)
+        return {image_id: self._download_links(image_assets, bands) for image_id, image_assets in assets.items()}
+
+    def get_preview_href(self, image_id):
+        """Return the upstream URL of the preview image of an image, or None if it has none"""
+        return self._preview_href(self.get_items_assets([image_id])[image_id])
+
+    @staticmethod
+    def _preview_href(assets):
+        """Pick the preview, thumbnail or overview asset URL, in that order of preference"""
+        for name in ("preview", "thumbnail", "overview"):
+            if name in assets and "href" in assets[name]:
+                return assets[name]["href"]
+        return None
+
+    @staticmethod
+    def _download_links(assets, bands=None):
+        """Collect the download links of the requested bands from the assets of an image"""
+        if not bands:
+            bands = ["B04", "B03", "B02"]  # Default to RGB
+
+        # Collect download links for each requested band
+        download_links = {}
+        for band in bands:
+            if band in assets:
+                download_links[band] = assets[band].get("href")
+
+        # If we couldn't find direct band links, look for a data link
+        if not download_links and "data" in assets:
+            download_links["data"] = assets["data"].get("href")
+
+        return download_links
+
     def search_with_get(self, geometry, start_date=None, end_date=None, max_cloud_coverage=20,
-                        page=1, limit=20, sort_by=None, sort_direction='desc'):
+                        page=1, limit=20, sort_by=None, sort_direction='desc', enrich=True):
         """
         Alternative search method using GET request instead of POST
         This is often more reliable as the STAC API implementation may have issues with CQL2
@@ -226,15 +752,7 @@ class STACService:
         """
         try:
             # Set default dates if not provided
-            if not start_date:
-                start_date = (datetime.datetime.now() - datetime.timedelta(days=15)).strftime("%Y-%m-%d")
-            elif isinstance(start_date, datetime.datetime):
-                start_date = start_date.strftime("%Y-%m-%d")
-
-            if not end_date:
-                end_date = datetime.datetime.now().strftime("%Y-%m-%d")
-            elif isinstance(end_date, datetime.datetime):
-                end_date = end_date.strftime("%Y-%m-%d")
+            start_date, end_date = self._normalize_dates(start_date, end_date)
 
             # Format the datetime for STAC API
             datetime_query = f"{start_date}T00:00:00Z/{end_date}T23:59:59Z"
@@ -259,215 +777,351 @@ class STACService:
                 sort_prefix = '-' if sort_direction.lower() == 'desc' else ''
                 params["sortby"] = f"{sort_prefix}{sort_by}"
 
+            if max_cloud_coverage < 100:
+                # Let the STAC API filter by cloud coverage unless it is known to ignore the filter
+                if self.upstream_cloud_filter is not False:
+                    stac_response = self._get_with_cloud_filter(url, params, max_cloud_coverage)
+                    if stac_response is not None:
+                        return self._build_search_result(stac_response, max_cloud_coverage, page, limit, enrich)
+
+                return self._search_with_get_refill(url, params, max_cloud_coverage, page, limit, enrich)
+
             # Make the request
             self.logger.info(f"Searching STAC API with params: {params}")
-            response = requests.get(url, params=params)
+            response = self.http.get(url, params=params)
             response.raise_for_status()
 
-            # Parse the response
-            stac_response = response.json()
+            # Parse the response and process the images
+            stac_response = json_backend.loads_search_page(response.content)
+            return self._build_search_result(stac_response, max_cloud_coverage, page, limit, enrich)
 
-            # Extract pagination links
-            next_link = None
-            prev_link = None
+        except Exception as e:
+            self.logger.error(f"Error searching for images with GET: {str(e)}")
+            raise e  # Re-raise to try the POST method
 
-            for link in stac_response.get("links", []):
-                if link.get("rel") == "next":
-                    next_link = link.get("href")
-                elif link.get("rel") == "prev":
-                    prev_link = link.get("href")
+    def _get_with_cloud_filter(self, url, params, max_cloud_coverage):
+        """
+        Search with a CQL2 cloud coverage filter and check that the server applied it
 
-            # Process results
-            result = self._process_stac_response(stac_response)
+        Returns:
+        - The STAC response, or None if the server rejected or ignored the filter
+        """
+        filtered_params = dict(params)
+        filtered_params["filter"] = f"eo:cloud_cover <= {max_cloud_coverage}"
+        filtered_params["filter-lang"] = "cql2-text"
+
+        self.logger.info(f"Searching STAC API with params: {filtered_params}")
+        response = self.http.get(url, params=filtered_params)
+        if response.status_code == 400:
+            # The 400 may be caused by the bbox or dates rather than the filter, so the filter is only
+            # given up on when the same search succeeds without it; otherwise the error is raised
+            self.http.get(url, params=params).raise_for_status()
+            self.logger.warning("STAC API rejected the cloud coverage filter, filtering results locally")
+            self.upstream_cloud_filter = False
+            return None
+        response.raise_for_status()
+
+        stac_response = json_backend.loads_search_page(response.content)
+        features = stac_response.get("features", [])
+        if any(self._cloud_cover(feature) > max_cloud_coverage for feature in features):
+            self.logger.warning("STAC API ignored the cloud coverage filter, filtering results locally")
+            self.upstream_cloud_filter = False
+            return None
+
+        if features:
+            self.upstream_cloud_filter = True
+        return stac_response
+
+    def _search_with_get_refill(self, url, params, max_cloud_coverage, page, limit, enrich=True):
+        """
+        Build a full page of cloud-filtered results when the STAC API cannot filter them
 
-            # Filter by cloud coverage after retrieving results
-            # (since we may not be able to filter by this in the GET request)
-            if max_cloud_coverage < 100:
-                result = [img for img in result if img.get('cloudCoverage', 100) <= max_cloud_coverage]
+        Upstream pages are pulled until `limit` matching images are collected, or until
+        `refill_max_pages` upstream pages have been scanned, in which case the partial page is
+        returned with `next` set. Only matching features are processed and enriched. The upstream
+        position where each filtered page starts is remembered, so later pages do not rescan from
+        the first upstream page.
 
-            # Return results with pagination info
-            return {
-                "images": result,
-                "pagination": {
-                    "page": page,
-                    "limit": limit,
-                    "total": stac_response.get("context", {}).get("matched") or len(result),
-                    "next": next_link is not None,
-                    "prev": prev_link is not None,
-                    "next_link": next_link,
-                    "prev_link": prev_link
-                }
+        Returns:
+        - Dictionary with results and pagination metadata
+        """
+        cursor_key = "|".join([url, str(max_cloud_coverage)] + [
+            f"{key}={value}" for key, value in sorted(params.items()) if key != "page"
+        ])
+        cursor = self._refill_cursors.get(f"{cursor_key}|{page}")
+        if cursor:
+            upstream_page, offset = cursor[:2]
+            # Matches still to skip when the previous page stopped at the page limit before its start
+            to_skip = cursor[2] if len(cursor) > 2 else 0
+        else:
+            upstream_page, offset = 1, 0
+            to_skip = (page - 1) * limit
+
+        matches = []
+        next_cursor = None
+        scanned = matched = pages_scanned = 0
+        upstream_total = None
+
+        while next_cursor is None:
+            upstream_params = dict(params, page=upstream_page)
+            self.logger.info(f"Refilling page {page} from STAC API with params: {upstream_params}")
+            response = self.http.get(url, params=upstream_params)
+            response.raise_for_status()
+            pages_scanned += 1
+
+            stac_response = json_backend.loads_search_page(response.content)
+            features = stac_response.get("features", [])
+            upstream_total = stac_response.get("context", {}).get("matched") or upstream_total
+
+            for index in range(offset, len(features)):
+                scanned += 1
+                if self._cloud_cover(features[index]) > max_cloud_coverage:
+                    continue
+                matched += 1
+                if to_skip:
+                    to_skip -= 1
+                elif len(matches) < limit:
+                    matches.append(features[index])
+                else:
+                    next_cursor = (upstream_page, index, 0)
+                    break
+
+            has_next = bool(features) and any(link.get("rel") == "next" for link in stac_response.get("links", []))
+            if next_cursor is None:
+                if not has_next:
+                    break  # Upstream results are exhausted
+                if len(matches) == limit or pages_scanned >= self.refill_max_pages:
+                    # The next page continues after this upstream page, even if this one is partial
+                    next_cursor = (upstream_page + 1, 0, to_skip)
+                upstream_page, offset = upstream_page + 1, 0
+
+        if next_cursor is not None:
+            self._refill_cursors.set(f"{cursor_key}|{page + 1}", list(next_cursor), 3600)
+            # Estimate the total from the share of upstream items that matched so far
+            estimate = round(upstream_total * matched / scanned) if upstream_total and scanned else 0
+            total = max(estimate, page * limit + 1)
+        else:
+            total = (page - 1) * limit + len(matches)
+
+        return {
+            "images": self._process_stac_response({"features": matches}, enrich=enrich),
+            "pagination": {
+                "page": page,
+                "limit": limit,
+                "total": total,
+                "total_estimated": next_cursor is not None,
+                "next": next_cursor is not None,
+                "prev": page > 1,
+                "next_link": None,
+                "prev_link": None
             }
+        }
 
-        except Exception as e:
-            self.logger.error(f"Error searching for images with GET: {str(e)}")
-            raise e  # Re-raise to try the POST method
+    def _build_search_result(self, stac_response, max_cloud_coverage, page, limit, enrich=True, request_body=None):
+        """
+        Process a STAC search response into images with pagination metadata
+
+        Parameters:
+        - request_body: Body of the POST search that returned the response, merged into its
+          next link's body when the link asks for it
+        """
+        # Extract pagination links
+        next_link = None
+        prev_link = None
+        next_method = "GET"
+        next_body = None
+
+        for link in stac_response.get("links", []):
+            if link.get("rel") == "next":
+                next_link = link.get("href")
+                next_method = (link.get("method") or "GET").upper()
+                if next_method == "POST":
+                    next_body = link.get("body")
+                    if link.get("merge") or next_body is None:
+                        next_body = dict(request_body or {}, **(next_body or {}))
+            elif link.get("rel") == "prev":
+                prev_link = link.get("href")
+
+        # Drop images above the cloud threshold before they are processed and enriched
+        features = stac_response.get("features", [])
+        if max_cloud_coverage < 100:
+            features = [feature for feature in features if self._cloud_cover(feature) <= max_cloud_coverage]
+        images = self._process_stac_response({"features": features}, enrich=enrich)
+
+        # Return results with pagination info
+        return {
+            "images": images,
+            "pagination": {
+                "page": page,
+                "limit": limit,
+                "total": stac_response.get("context", {}).get("matched") or len(images),
+                "next": next_link is not None,
+                "prev": prev_link is not None,
+                "next_link": next_link,
+                "next_method": next_method,
+                "next_body": next_body,
+                "prev_link": prev_link
+            }
+        }
+
+    @staticmethod
+    def _cloud_cover(feature):
+        """Return the cloud coverage of a STAC feature"""
+        return feature.get("properties", {}).get("eo:cloud_cover", 0)
 
-    def _process_stac_response(self, stac_response):
+    def _process_stac_response(self, stac_response, enrich=True):
         """Helper method to process STAC API response"""
-        images = []
+        with metrics.timed("process_stac"):
+            images = self._build_images(stac_response)
 
-        # Process each feature (image) from the response
-        for feature in stac_response.get("features", []):
-            # Extract basic metadata
-            properties = feature.get("properties", {})
-            image_id = feature.get("id", "").replace(".SAFE", "")
+        # Water level data is fetched for the whole page at once
+        if enrich:
+            self._enrich_with_water_levels(images)
 
-            # Extract date
-            datetime_str = properties.get("datetime")
-            if datetime_str:
-                try:
-                    date_obj = datetime.datetime.fromisoformat(datetime_str.replace("Z", "+00:00"))
-                except ValueError:
-                    # Fallback if the date format is unexpected
-                    date_obj = datetime.datetime.now()
-            else:
-                date_obj = datetime.datetime.now()
-
-            # Get cloud coverage
-            cloud_coverage = properties.get("eo:cloud_cover", 0)
-
-            # Get the sun angle if available
-            sun_azimuth = properties.get("view:sun_azimuth")
-            sun_elevation = properties.get("view:sun_elevation")
-
-            # Get preview URL
-            assets = feature.get("assets", {})
-            preview_url = None
-            if "preview" in assets and "href" in assets["preview"]:
-                preview_url = assets["preview"]["href"]
-            elif "thumbnail" in assets and "href" in assets["thumbnail"]:
-                preview_url = assets["thumbnail"]["href"]
-            elif "overview" in assets and "href" in assets["overview"]:
-                preview_url = assets["overview"]["href"]
-
-            # List available bands
-            bands = []
-            for asset_name, asset_info in assets.items():
-                if asset_name.startswith("B") and len(asset_name) <= 3:
-                    bands.append(asset_name)
-
-            # Get center coordinates for water level station lookup
-            center_lon = None
-            center_lat = None
-            if feature.get("geometry"):
-                bbox = shape(feature.get("geometry")).bounds
-                center_lon = (bbox[0] + bbox[2]) / 2
-                center_lat = (bbox[1] + bbox[3]) / 2
-
-            # Add water level data if available
-            water_level_data = None
-            nearest_station = None
-
-            if self.water_level_service and center_lon is not None and center_lat is not None:
-                try:
-                    # Find the nearest water level station
-                    nearest_station = self.water_level_service.find_nearest_station(center_lon, center_lat)
-
-                    if nearest_station and nearest_station.get("stationId"):
-                        # Get water level at the image capture time
-                        water_level_data = self.water_level_service.get_water_level_at_time(
-                            nearest_station.get("stationId"),
-                            date_obj
-                        )
-                except Exception as water_level_err:
-                    self.logger.error(f"Error fetching water level data: {str(water_level_err)}")
-
-            # Create image info object
-            image_info = {
-                "id": image_id,
-                "date": date_obj.isoformat(),
-                "cloudCoverage": cloud_coverage,
-                "preview_url": preview_url,
-                "sun_azimuth": sun_azimuth,
-                "sun_elevation": sun_elevation,
-                "bands": bands if bands else ["B02", "B03", "B04", "B08"],  # Default if not found
-                "metadata": {
-                    "platform": properties.get("platform", "Sentinel-2"),
-                    "instrument": properties.get("instrument", "MSI"),
-                    "productType": properties.get("s2:product_type", "L2A"),
-                    "epsg": 4326,
-                    "orbit": properties.get("sat:orbit_state"),
-                    "tile_id": properties.get("s2:tile_id")
-                }
-            }
+        return images
 
-            # Add water level data if available
-            if water_level_data:
-                image_info["waterLevel"] = {
-                    "value": water_level_data.get("value"),
-                    "observed": water_level_data.get("observed"),
-                    "stationId": water_level_data.get("stationId"),
-                    "parameterId": water_level_data.get("parameterId"),
-                    "stationName": nearest_station.get("name") if nearest_station else None,
-                    "stationDistance": nearest_station.get("distance") if nearest_station else None
-                }
+    def _build_images(self, stac_response):
+        """Convert the features of a STAC API response into image records"""
+        return [ImageRecord.from_feature(feature, self._preview_href(feature.get("assets", {})))
+                for feature in stac_response.get("features", [])]
 
-            # Add closest station info even if water level data is not available
-            elif nearest_station:
-                image_info["waterLevel"] = {
-                    "stationId": nearest_station.get("stationId"),
-                    "stationName": nearest_station.get("name"),
-                    "stationDistance": nearest_station.get("distance"),
-                    "value": None,
-                    "message": "Water level data not available for the image capture time"
-                }
+    def _enrich_with_water_levels(self, images):
+        """
+        Attach water level data to processed images
 
-            images.append(image_info)
+        The candidate stations of every image's tile are resolved first, then all observations
+        are fetched in one bulk request to the water level service. Images whose closest
+        station has no reading are retried with the next candidate.
 
-        return images
+        Parameters:
+        - images: List of image records, updated in place
+        """
+        with metrics.timed("enrich"):
+            for _ in self.iter_water_level_enrichment(images):
+                pass
+
+    def iter_water_level_enrichment(self, images):
+        """
+        Attach water level data to processed images, one station at a time as each finishes
 
-    def _add_water_level_data(self, image_details):
-        """Add water level data to image details"""
+        Parameters:
+        - images: List of image records, updated in place
+
+        Yields:
+        - Lists of the images that just received their waterLevel block
+        """
         if not self.water_level_service:
             return
 
-        # Extract the datetime from the image details
-        datetime_str = image_details.get("properties", {}).get("datetime")
-        if not datetime_str:
-            return
+        # Resolve the candidate stations for all images in one batch, closest first
+        located = [image_info for image_info in images if image_info.center]
+        try:
+            candidates = self.water_level_service.find_candidate_stations(
+                [(image_info.tile_id, *image_info.center) for image_info in located])
+        except Exception as water_level_err:
+            self.logger.error(f"Error finding nearest station: {str(water_level_err)}")
+            candidates = []
+
+        pending = []
+        for image_info, stations in zip(located, candidates):
+            stations = [station for station in stations if station.get("stationId")]
+            if stations:
+                pending.append((image_info, stations, image_info.timestamp))
+
+        if pending:
+            self.logger.info(f"Fetching water level data for {len(pending)} images")
+
+        # Images whose closest station has no reading fall back to the next candidate
+        while pending:
+            # Fetch each distinct observation once, grouped by station
+            lookups_by_key = {}
+            for image_info, stations, timestamp in pending:
+                lookups_by_key.setdefault((stations[0]["stationId"], timestamp), []).append(
+                    (image_info, stations, timestamp))
+
+            retry = []
+
+            def resolve(water_level_data, lookups):
+                enriched = []
+                for image_info, stations, timestamp in lookups:
+                    has_value = water_level_data and water_level_data.get("value") is not None
+                    if not has_value and len(stations) > 1:
+                        retry.append((image_info, stations[1:], timestamp))
+                        continue
+                    image_info.water_level = self._build_water_level_info(water_level_data, stations[0])
+                    enriched.append(image_info)
+                return enriched
 
-        # Get the center of the image geometry
-        if image_details.get("geometry"):
-            bbox = shape(image_details.get("geometry")).bounds
-            center_lon = (bbox[0] + bbox[2]) / 2
-            center_lat = (bbox[1] + bbox[3]) / 2
-        else:
+            try:
+                for results in self.water_level_service.iter_water_levels_at_times(list(lookups_by_key)):
+                    enriched = []
+                    for key, water_level_data in results.items():
+                        enriched.extend(resolve(water_level_data, lookups_by_key.pop(key, [])))
+                    if enriched:
+                        yield enriched
+            except Exception as water_level_err:
+                self.logger.error(f"Error fetching water level data: {str(water_level_err)}")
+
+            # Observations that could not be fetched count as missing
+            enriched = []
+            for lookups in lookups_by_key.values():
+                enriched.extend(resolve(None, lookups))
+            if enriched:
+                yield enriched
+
+            pending = retry
+
+    def _build_water_level_info(self, water_level_data, nearest_station):
+        """Build the waterLevel block for an image from an observation and its station"""
+        if water_level_data:
+            return {
+                "value": water_level_data.get("value"),
+                "observed": water_level_data.get("observed"),
+                "stationId": water_level_data.get("stationId"),
+                "parameterId": water_level_data.get("parameterId"),
+                "stationName": nearest_station.get("name"),
+                "stationDistance": nearest_station.get("distance")
+            }
+
+        # Add closest station info even if water level data is not available
+        return {
+            "stationId": nearest_station.get("stationId"),
+            "stationName": nearest_station.get("name"),
+            "stationDistance": nearest_station.get("distance"),
+            "value": None,
+            "message": "Water level data not available for the image capture time"
+        }
+
+    def _add_water_level_data(self, details_list):
+        """
+        Add water level data to the properties of image details
+
+        The images go through the same batched enrichment as search results.
+
+        Parameters:
+        - details_list: List of STAC item dictionaries, updated in place
+        """
+        if not self.water_level_service:
             return
 
+        located = []
+        for image_details in details_list:
+            if not image_details.get("properties", {}).get("datetime"):
+                continue
+            try:
+                image_info = ImageRecord.from_feature(image_details)
+            except Exception as e:
+                self.logger.error(f"Error reading image {image_details.get('id')}: {str(e)}")
+                continue
+            if image_info.center:
+                located.append((image_details, image_info))
+
         try:
-            # Find the nearest water level station
-            nearest_station = self.water_level_service.find_nearest_station(center_lon, center_lat)
-
-            if nearest_station and nearest_station.get("stationId"):
-                # Get water level at the image capture time
-                date_obj = datetime.datetime.fromisoformat(datetime_str.replace("Z", "+00:00"))
-                water_level_data = self.water_level_service.get_water_level_at_time(
-                    nearest_station.get("stationId"),
-                    date_obj
-                )
-
-                if water_level_data:
-                    # Add water level data to the image details
-                    if "properties" not in image_details:
-                        image_details["properties"] = {}
-
-                    image_details["properties"]["waterLevel"] = {
-                        "value": water_level_data.get("value"),
-                        "observed": water_level_data.get("observed"),
-                        "stationId": water_level_data.get("stationId"),
-                        "parameterId": water_level_data.get("parameterId"),
-                        "stationName": nearest_station.get("name"),
-                        "stationDistance": nearest_station.get("distance")
-                    }
-                else:
-                    # Add station info even if water level data is not available
-                    image_details["properties"]["waterLevel"] = {
-                        "stationId": nearest_station.get("stationId"),
-                        "stationName": nearest_station.get("name"),
-                        "stationDistance": nearest_station.get("distance"),
-                        "value": None,
-                        "message": "Water level data not available for the image capture time"
-                    }
+            self._enrich_with_water_levels([image_info for _, image_info in located])
         except Exception as e:
-            self.logger.error(f"Error adding water level data: {str(e)}")
\ No newline at end of file
+            self.logger.error(f"Error adding water level data: {str(e)}")
+
+        # Add water level data, or the station info if no observation was found
+        for image_details, image_info in located:
+            if image_info.water_level is not None:
+                image_details.setdefault("properties", {})["waterLevel"] = image_info.water_level
@@ -0,0 +1,256 @@
+# app/services/station_catalogue.py
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Mean Earth radius in metres, used for haversine distances
+EARTH_RADIUS = 6371008.8
+
+# Query points per distance matrix in batch lookups, which bounds the matrix to this many rows
+BATCH_CHUNK_SIZE = 256
+
+
+def station_match(station: Dict[str, Any], distance: float) -> Dict[str, Any]:
+    """Build the station dictionary returned by nearest station lookups, with the distance in metres"""
+    return {
+        "stationId": station.get("stationId"),
+        "name": station.get("name"),
+        "coordinates": station.get("coordinates", []),
+        "distance": distance,
+        "parameterId": station.get("parameterId", [])
+    }
+
+
+class StationCatalogue:
+    """In-process catalogue of DMI water level stations, indexed by ID and location"""
+
+    def __init__(self, loader: Callable[[], List[Dict[str, Any]]], ttl: float = 3600, retry_after: float = 60):
+        """
+        Parameters:
+        - loader: Callable returning the raw station GeoJSON features from the DMI API
+        - ttl: Seconds after which the catalogue is refreshed in the background
+        - retry_after: Seconds to wait after a failed first load before lookups try loading again
+        """
+        self.logger = logging.getLogger(__name__)
+        self._loader = loader
+        self.ttl = ttl
+        self.retry_after = retry_after
+
+        self._load_lock = threading.Lock()
+        self._refreshing = False
+        self._loaded_at = None
+        self._failed_at = None
+
+        self._stations = []
+        self._by_id = {}
+        # Stations with their longitudes and latitudes in radians, swapped as one tuple
+        self._locations = ([], np.empty(0), np.empty(0))
+        self._fingerprint = None
+
+    def set_ttl(self, ttl: float):
+        """Set the number of seconds before the catalogue is refreshed"""
+        self.ttl = ttl
+
+    def invalidate(self):
+        """Drop the loaded catalogue so the next lookup loads it again"""
+        with self._load_lock:
+            self._loaded_at = None
+            self._failed_at = None
+
+    def stations(self) -> List[Dict[str, Any]]:
+        """Return all catalogued stations"""
+        self._ensure_loaded()
+        return list(self._stations)
+
+    def get(self, station_id: str) -> Optional[Dict[str, Any]]:
+        """Return the station with the given ID or None if it is not catalogued"""
+        self._ensure_loaded()
+        return self._by_id.get(station_id)
+
+    def fingerprint(self) -> Optional[str]:
+        """Return a hash of the catalogued station IDs and locations, which changes when the stations do"""
+        self._ensure_loaded()
+        return self._fingerprint
+
+    def nearest(self, lon: float, lat: float,
+                max_distance: Optional[float] = None) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Find the station closest to a coordinate
+
+        Parameters:
+        - lon: Longitude
+        - lat: Latitude
+        - max_distance: Optional maximum distance in metres
+
+        Returns:
+        - Tuple of (station, distance in metres) or None if no station is close enough
+        """
+        matches = self.nearest_many(lon, lat, 1, max_distance)
+        return matches[0] if matches else None
+
+    def nearest_many(self, lon: float, lat: float, count: int,
+                     max_distance: Optional[float] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Find the stations closest to a coordinate
+
+        Parameters:
+        - lon: Longitude
+        - lat: Latitude
+        - count: Maximum number of stations to return
+        - max_distance: Optional maximum distance in metres
+
+        Returns:
+        - List of (station, distance in metres) tuples, closest first
+        """
+        return self.nearest_batch([lon], [lat], count, max_distance)[0]
+
+    def nearest_batch(self, lons: Sequence[float], lats: Sequence[float], count: int = 1,
+                      max_distance: Optional[float] = None) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        Find the stations closest to many coordinates at once, using haversine distances
+
+        Parameters:
+        - lons: Longitudes of the query points
+        - lats: Latitudes of the query points
+        - count: Maximum number of stations to return per point
+        - max_distance: Optional maximum distance in metres
+
+        Returns:
+        - One list of (station, distance in metres) tuples per point, closest first
+        """
+        self._ensure_loaded()
+        stations, station_lons, station_lats = self._locations
+        if not len(lons):
+            return []
+        if not stations or count < 1:
+            return [[] for _ in lons]
+
+        count = min(count, len(stations))
+        lons = np.radians(np.asarray(lons, dtype=np.float64))
+        lats = np.radians(np.asarray(lats, dtype=np.float64))
+
+        results = []
+        for chunk in range(0, len(lons), BATCH_CHUNK_SIZE):
+            chunk_lons = lons[chunk:chunk + BATCH_CHUNK_SIZE, np.newaxis]
+            chunk_lats = lats[chunk:chunk + BATCH_CHUNK_SIZE, np.newaxis]
+
+            # Distance matrix of shape (chunk points, stations)
+            a = (np.sin((station_lats - chunk_lats) / 2) ** 2
+                 + np.cos(chunk_lats) * np.cos(station_lats) * np.sin((station_lons - chunk_lons) / 2) ** 2)
+            distances = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+            # Select the closest stations of each point without sorting the whole row, then order them
+            if count < len(stations):
+                closest = np.argpartition(distances, count - 1, axis=1)[:, :count]
+            else:
+                closest = np.broadcast_to(np.arange(count), distances.shape)
+            order = np.argsort(np.take_along_axis(distances, closest, axis=1), axis=1, kind="stable")
+            closest = np.take_along_axis(closest, order, axis=1)
+
+            for row, indexes in enumerate(closest):
+                matches = []
+                for index in indexes:
+                    distance = float(distances[row, index])
+                    if max_distance is not None and distance > max_distance:
+                        break
+                    matches.append((stations[index], distance))
+                results.append(matches)
+        return results
+
+    def refresh(self) -> bool:
+        """
+        Reload the catalogue from the DMI API and rebuild the indexes
+
+        Returns:
+        - True if the catalogue was reloaded, False if loading failed
+        """
+        try:
+            features = self._loader()
+        except Exception as e:
+            self.logger.error(f"Error loading station catalogue: {str(e)}")
+            self._failed_at = time.monotonic()
+            return False
+
+        stations = []
+        for feature in features:
+            station = self._build_station(feature)
+            if station:
+                stations.append(station)
+
+        by_id = {station["stationId"]: station for station in stations}
+        lons = np.radians(np.array([station["longitude"] for station in stations], dtype=np.float64))
+        lats = np.radians(np.array([station["latitude"] for station in stations], dtype=np.float64))
+
+        digest = hashlib.sha1()
+        for station in sorted(stations, key=lambda station: station["stationId"]):
+            digest.update(f"{station['stationId']}:{station['longitude']}:{station['latitude']};".encode())
+
+        # Swap in the new indexes in one go so readers never see a partial catalogue
+        self._stations, self._by_id, self._locations = stations, by_id, (stations, lons, lats)
+        self._fingerprint = digest.hexdigest()
+        self._loaded_at = time.monotonic()
+        self._failed_at = None
+        self.logger.info(f"Loaded {len(stations)} water level stations into the catalogue")
+        return True
+
+    def _ensure_loaded(self):
+        """
+        Load the catalogue on first use and schedule a background refresh once it is stale
+
+        After a failed first load the catalogue stays empty for `retry_after` seconds, so lookups
+        do not each wait for the DMI API while it is unreachable.
+        """
+        if self._loaded_at is None:
+            if self._recently_failed():
+                return
+            with self._load_lock:
+                # Another thread may have finished (or failed) loading while we waited for the lock
+                if self._loaded_at is None and not self._recently_failed():
+                    self.refresh()
+        elif time.monotonic() - self._loaded_at > self.ttl:
+            self._refresh_in_background()
+
+    def _recently_failed(self) -> bool:
+        """Return whether the last load failed less than `retry_after` seconds ago"""
+        failed_at = self._failed_at
+        return failed_at is not None and time.monotonic() - failed_at < self.retry_after
+
+    def _refresh_in_background(self):
+        """Start a background refresh unless one is already running"""
+        with self._load_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                if not self.refresh():
+                    # Keep serving the stale catalogue and retry after another TTL
+                    self._loaded_at = time.monotonic()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="station-catalogue-refresh", daemon=True).start()
+
+    @staticmethod
+    def _build_station(feature: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Convert a station GeoJSON feature into a catalogue entry"""
+        properties = feature.get("properties", {})
+        coordinates = feature.get("geometry", {}).get("coordinates", [])
+        station_id = properties.get("stationId")
+        if not station_id or len(coordinates) < 2:
+            return None
+
+        return {
+            "stationId": station_id,
+            "name": properties.get("name"),
+            "type": properties.get("type"),
+            "coordinates": coordinates,
+            "longitude": coordinates[0],
+            "latitude": coordinates[1],
+            "parameterId": properties.get("parameterId", [])
+        }
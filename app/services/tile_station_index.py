@@ -0,0 +1,169 @@
+# app/services/tile_station_index.py
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from app.services.station_catalogue import StationCatalogue, station_match
+
+# Version of the persisted table; files written with another version are discarded
+FORMAT_VERSION = 1
+
+
+class TileStationIndex:
+    """
+    Table of the water level stations closest to each Sentinel-2 tile
+
+    Sentinel-2 tiles are fixed, so the stations closest to a tile only change when the station
+    catalogue does. Each tile is assigned the first time it is seen, from the centre of the tile
+    (see sentinel2_tiles.tile_center), and the table is rebuilt from the stored centres whenever
+    the catalogue changes. The table is persisted as JSON so it survives restarts; new
+    assignments are written together, at most once every `save_delay` seconds.
+    """
+
+    def __init__(self, catalogue: StationCatalogue, path: Optional[str] = None, candidates: int = 3,
+                 save_delay: float = 5):
+        """
+        Parameters:
+        - catalogue: Station catalogue the stations are taken from
+        - path: Optional path of the JSON file the table is persisted to
+        - candidates: Number of stations kept per tile, closest first
+        - save_delay: Seconds changes are collected before the table is written
+        """
+        self.logger = logging.getLogger(__name__)
+        self.catalogue = catalogue
+        self.path = path
+        self.candidates = candidates
+        self.save_delay = save_delay
+
+        self._lock = threading.Lock()
+        self._tiles = {}
+        self._fingerprint = None
+        self._dirty = False
+        self._save_timer = None
+        self._load()
+
+    def get(self, tile_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the assignment of a tile
+
+        Returns:
+        - Dictionary with the tile `center` [lon, lat] and its candidate `stations`, or None if the tile is unknown
+        """
+        self._check_catalogue()
+        return self._tiles.get(tile_id)
+
+    def assign(self, tile_id: str, lon: float, lat: float) -> Dict[str, Any]:
+        """
+        Assign the closest stations to a tile, unless it is assigned already
+
+        Parameters:
+        - tile_id: Sentinel-2 tile ID
+        - lon: Longitude of the tile centre (not of an image footprint, which may cover part of the tile)
+        - lat: Latitude of the tile centre
+
+        Returns:
+        - The tile assignment, as returned by get
+        """
+        return self.assign_many({tile_id: (lon, lat)})[tile_id]
+
+    def assign_many(self, centers: Dict[str, Tuple[float, float]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Assign the closest stations to many tiles in one batch query, skipping tiles assigned already
+
+        Parameters:
+        - centers: Dictionary mapping tile ID to the (lon, lat) of its centre
+
+        Returns:
+        - Dictionary mapping each tile ID to its assignment
+        """
+        self._check_catalogue()
+        entries = {tile_id: self._tiles[tile_id] for tile_id in centers if tile_id in self._tiles}
+        new_tiles = {tile_id: center for tile_id, center in centers.items() if tile_id not in entries}
+        if not new_tiles:
+            return entries
+
+        assigned = self._assign_centers(new_tiles)
+        with self._lock:
+            for tile_id, entry in assigned.items():
+                entries[tile_id] = self._tiles.setdefault(tile_id, entry)
+        self._save()
+        return entries
+
+    def _check_catalogue(self):
+        """Rebuild every assignment from the stored tile centres if the catalogue has changed"""
+        fingerprint = self.catalogue.fingerprint()
+        if fingerprint is None or fingerprint == self._fingerprint:
+            return
+
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                return
+            tiles = self._assign_centers({tile_id: entry["center"] for tile_id, entry in self._tiles.items()})
+            self._tiles, self._fingerprint = tiles, fingerprint
+
+        self.logger.info(f"Rebuilt station assignments for {len(tiles)} tiles after a catalogue change")
+        self._save()
+
+    def _assign_centers(self, centers: Dict[str, Tuple[float, float]]) -> Dict[str, Dict[str, Any]]:
+        """Find the candidate stations of tile centres, closest first"""
+        tile_ids = list(centers)
+        matches = self.catalogue.nearest_batch([centers[tile_id][0] for tile_id in tile_ids],
+                                               [centers[tile_id][1] for tile_id in tile_ids], self.candidates)
+        return {
+            tile_id: {
+                "center": list(centers[tile_id]),
+                "stations": [station_match(station, distance) for station, distance in tile_matches]
+            }
+            for tile_id, tile_matches in zip(tile_ids, matches)
+        }
+
+    def _load(self):
+        """Load the persisted table, if any"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("version") != FORMAT_VERSION:
+                self.logger.info("Discarding tile station index written by another version")
+                return
+            self._tiles, self._fingerprint = data["tiles"], data["fingerprint"]
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.error(f"Error loading tile station index: {str(e)}")
+
+    def _save(self):
+        """Schedule the table to be persisted, so assignments made close together are written once"""
+        if not self.path:
+            return
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Persist pending changes, replacing the file in one step so readers never see a partial one"""
+        if not self.path:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            data = {"version": FORMAT_VERSION, "fingerprint": self._fingerprint, "tiles": dict(self._tiles)}
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            self.logger.error(f"Error saving tile station index: {str(e)}")
@@ -1,22 +1,104 @@
 # app/services/water_level_service.py
 import datetime
 import logging
-import requests
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from flask import current_app
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union, Any
+
+import numpy as np
+
+from app.services import json_backend, metrics, sentinel2_tiles
+from app.services.http_client import HttpClient
+from app.services.observation_series import ObservationSeries, format_epoch, parse_timestamp
+from app.services.observation_store import ObservationStore
+from app.services.station_catalogue import StationCatalogue, station_match
+from app.services.tile_station_index import TileStationIndex
+
+# Readings further than this from the requested time are not used
+OBSERVATION_TOLERANCE = datetime.timedelta(minutes=5)
+# Typical interval between the readings of a DMI water level station
+OBSERVATION_INTERVAL = datetime.timedelta(minutes=10)
+# Number of readings that take about as long to download and parse as one extra request
+OBSERVATION_REQUEST_COST = 100
+# Requested times further apart than this (about 17 hours) are fetched as separate windows, as
+# the readings in between would cost more than a separate request
+OBSERVATION_MAX_GAP = OBSERVATION_INTERVAL * OBSERVATION_REQUEST_COST
+# Number of observations requested per page when fetching a series
+OBSERVATION_PAGE_SIZE = 10000
 
 
 class WaterLevelService:
     """Service for interacting with DMI Water Level API"""
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, station_cache_ttl: float = 3600, max_workers: int = 8):
         self.logger = logging.getLogger(__name__)
         self.base_url = "https://dmigw.govcloud.dk/v2/oceanObs"
         self.api_key = api_key
+        self.http = HttpClient("dmi", timeout=(5, 30))
+        self.station_catalogue = StationCatalogue(self._fetch_station_features, ttl=station_cache_ttl)
+        self.max_workers = max_workers
+        self._executor = None
+        self.observation_store = None
+        self.tile_stations = TileStationIndex(self.station_catalogue)
+        self.max_station_distance = None
 
     def set_api_key(self, api_key: str):
         """Set the API key for the DMI API"""
-        self.api_key = api_key
+        if api_key != self.api_key:
+            self.api_key = api_key
+            # Stations loaded without (or with another) key may be incomplete
+            self.station_catalogue.invalidate()
+
+    def set_station_cache_ttl(self, ttl: float):
+        """Set how many seconds the station catalogue is kept before it is refreshed"""
+        self.station_catalogue.set_ttl(ttl)
+
+    def set_max_workers(self, max_workers: int):
+        """Set the maximum number of concurrent requests when fetching water levels in bulk"""
+        if max_workers != self.max_workers:
+            self.max_workers = max_workers
+            if self._executor:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def set_observation_store(self, observation_store: Optional[ObservationStore]):
+        """Set the local store that observations are read from before asking DMI"""
+        self.observation_store = observation_store
+
+    def set_tile_station_index(self, path: Optional[str] = None, candidates: int = 3):
+        """Set where the tile to station table is persisted and how many stations it keeps per tile"""
+        self.tile_stations = TileStationIndex(self.station_catalogue, path, candidates)
+
+    def set_max_station_distance(self, max_distance: Optional[float]):
+        """Set the maximum distance in metres between an image and the stations used for it (None for no limit)"""
+        self.max_station_distance = max_distance
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Return the thread pool shared by all bulk water level requests, creating it on first use"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, self.max_workers), thread_name_prefix="water-level")
+        return self._executor
+
+    def _fetch_station_features(self) -> List[Dict[str, Any]]:
+        """
+        Download all active stations from the DMI API for the station catalogue
+
+        Returns:
+        - List of station GeoJSON features
+        """
+        url = f"{self.base_url}/collections/station/items"
+        params = {
+            "status": "Active",
+            "limit": 1000,  # Get every station in one request
+            "api-key": self.api_key
+        }
+
+        self.logger.info("Fetching water level station catalogue")
+        response = self.http.get(url, params=params)
+        response.raise_for_status()
+
+        return json_backend.loads(response.content).get("features", [])
 
     def _get_station_by_id(self, station_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -29,11 +111,7 @@ class WaterLevelService:
         - Dictionary with station information or None if not found
         """
         try:
-            stations = self.get_all_stations()
-            for station in stations:
-                if station.get("id") == station_id:
-                    return station
-            return None
+            return self.station_catalogue.get(station_id)
         except Exception as e:
             self.logger.error(f"Error finding station {station_id}: {str(e)}")
             return None
@@ -51,156 +129,343 @@ class WaterLevelService:
         Returns:
         - Dictionary with water level data or None if not found
         """
+        timestamp_str = self._format_timestamp(timestamp)
+        if timestamp_str is None:
+            return None
+
+        levels = self.get_water_levels_at_times([(station_id, timestamp_str)], parameter_id)
+        return levels.get((station_id, timestamp_str))
+
+    def get_water_levels_at_times(self, lookups: Iterable[Tuple[str, Union[str, datetime.datetime]]],
+                                  parameter_id: str = "sealev_dvr") -> Dict[Tuple[str, str], Optional[Dict[str, Any]]]:
+        """
+        Get water level data for many (station, time) pairs at once
+
+        The timestamps are grouped by station and each station's series is fetched for the
+        whole requested time window in a few paginated calls, with the stations fetched
+        concurrently. Each timestamp is then matched to the closest reading in memory.
+
+        Parameters:
+        - lookups: Iterable of (station_id, timestamp) tuples (ISO format or datetime objects)
+        - parameter_id: The parameter ID to fetch (default: sealev_dvr)
+
+        Returns:
+        - Dictionary mapping (station_id, timestamp as YYYY-MM-DDTHH:MM:SSZ) to water level data or None
+        """
+        results = {}
+        for station_results in self.iter_water_levels_at_times(lookups, parameter_id):
+            results.update(station_results)
+        return results
+
+    def iter_water_levels_at_times(self, lookups: Iterable[Tuple[str, Union[str, datetime.datetime]]],
+                                   parameter_id: str = "sealev_dvr"
+                                   ) -> Iterator[Dict[Tuple[str, str], Optional[Dict[str, Any]]]]:
+        """
+        Get water level data for many (station, time) pairs, one station at a time as each finishes
+
+        The stations are fetched concurrently as in get_water_levels_at_times, but the results
+        of each station are yielded as soon as they are available.
+
+        Parameters:
+        - lookups: Iterable of (station_id, timestamp) tuples (ISO format or datetime objects)
+        - parameter_id: The parameter ID to fetch (default: sealev_dvr)
+
+        Yields:
+        - Dictionaries mapping (station_id, timestamp) to water level data or None, one per station
+        """
+        timestamps_by_station = {}
+        for station_id, timestamp in lookups:
+            timestamp_str = self._format_timestamp(timestamp)
+            if timestamp_str is not None:
+                timestamps_by_station.setdefault(station_id, set()).add(timestamp_str)
+
+        if not timestamps_by_station:
+            return
+
+        executor = self._get_executor()
+        futures = {
+            executor.submit(metrics.in_current_context(self._get_station_levels),
+                            station_id, sorted(timestamps), parameter_id): station_id
+            for station_id, timestamps in timestamps_by_station.items()
+        }
+
         try:
-            # Format the timestamp if it's a datetime object
-            if isinstance(timestamp, datetime.datetime):
-                timestamp_str = timestamp.strftime("%Y-%m-%dT%H:%M:%SZ")
-            else:
-                # If it's already a string, ensure it's in the correct format
-                # Convert to datetime and back to string to ensure format
+            for future in as_completed(futures):
+                station_id = futures[future]
                 try:
-                    dt = datetime.datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                    timestamp_str = dt.strftime("%Y-%m-%dT%H:%M:%SZ")
-                except ValueError:
-                    self.logger.error(f"Invalid timestamp format: {timestamp}")
-                    return None
-
-            # Calculate a 10-minute window around the timestamp (±5 minutes)
-            dt = datetime.datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-            start_time = (dt - datetime.timedelta(minutes=5)).strftime("%Y-%m-%dT%H:%M:%SZ")
-            end_time = (dt + datetime.timedelta(minutes=5)).strftime("%Y-%m-%dT%H:%M:%SZ")
-
-            # Build the URL with datetime range
-            datetime_param = f"{start_time}/{end_time}"
-
-            # Make the API request
-            url = f"{self.base_url}/collections/observation/items"
-            params = {
-                "stationId": station_id,
-                "parameterId": parameter_id,
-                "datetime": datetime_param,
-                "limit": 2,  # We only need a few closest readings
-                "api-key": self.api_key
-            }
+                    yield future.result()
+                except Exception as e:
+                    self.logger.error(f"Error fetching water level data for station {station_id}: {str(e)}")
+                    yield {(station_id, timestamp_str): None for timestamp_str in timestamps_by_station[station_id]}
+        finally:
+            # Stations not started yet are dropped when the caller stops early
+            for future in futures:
+                future.cancel()
+
+    def _get_station_levels(self, station_id: str, timestamps: List[str],
+                            parameter_id: str) -> Dict[Tuple[str, str], Optional[Dict[str, Any]]]:
+        """
+        Look up the water level at each of the given times for one station
 
-            self.logger.info(f"Fetching water level data for station {station_id} at {timestamp_str}")
-            response = requests.get(url, params=params)
-            response.raise_for_status()
+        Parameters:
+        - station_id: The ID of the DMI water level station
+        - timestamps: Sorted timestamps formatted as YYYY-MM-DDTHH:MM:SSZ
+        - parameter_id: The parameter ID to fetch
 
-            # Parse the response
-            data = response.json()
-            features = data.get("features", [])
-
-            # Get the station information including coordinates
-            station_info = self._get_station_by_id(station_id)
-
-            if not features:
-                self.logger.warning(f"No water level data found for station {station_id} at {timestamp_str}")
-                # Return station info with coordinates even if no water level data is found
-                if station_info:
-                    return {
-                        "value": None,
-                        "observed": timestamp_str,
-                        "stationId": station_id,
-                        "parameterId": parameter_id,
-                        "qcStatus": None,
-                        "latitude": station_info.get("latitude"),
-                        "longitude": station_info.get("longitude"),
-                        "name": station_info.get("name")
-                    }
-                return None
+        Returns:
+        - Dictionary mapping (station_id, timestamp) to water level data or None
+        """
+        station_info = self._get_station_by_id(station_id)
+        tolerance = OBSERVATION_TOLERANCE.total_seconds()
+        epochs = [parse_timestamp(timestamp_str).timestamp() for timestamp_str in timestamps]
+
+        results = {}
+        for window_start, window_end in self._split_windows(epochs):
+            # Pad the window so readings just outside the first and last timestamp are found
+            series = self._get_series(station_id, parameter_id,
+                                      epochs[window_start] - tolerance, epochs[window_end] + tolerance)
+
+            for index in range(window_start, window_end + 1):
+                timestamp_str = timestamps[index]
+                closest = series.closest(epochs[index], tolerance)
+                results[(station_id, timestamp_str)] = self._build_water_level(
+                    station_id, parameter_id, timestamp_str,
+                    series.observation(closest) if closest is not None else None, station_info)
+
+        return results
+
+    def _get_series(self, station_id: str, parameter_id: str, start: float, end: float) -> ObservationSeries:
+        """
+        Get the observation series of a station between two times
 
-            # Find the closest reading to the requested timestamp
-            closest_reading = min(features, key=lambda x: self._time_difference(
-                x.get("properties", {}).get("observed", ""), timestamp_str))
+        When an observation store is configured, only the parts of the window it does not
+        hold yet are fetched from DMI, and the series is then read from the store.
 
-            result = {
-                "value": closest_reading.get("properties", {}).get("value"),
-                "observed": closest_reading.get("properties", {}).get("observed"),
-                "stationId": closest_reading.get("properties", {}).get("stationId"),
-                "parameterId": closest_reading.get("properties", {}).get("parameterId"),
-                "qcStatus": closest_reading.get("properties", {}).get("qcStatus")
-            }
+        Parameters:
+        - station_id: The ID of the DMI water level station
+        - parameter_id: The parameter ID to fetch
+        - start: Start of the window in epoch seconds
+        - end: End of the window in epoch seconds
 
-            # Add station location coordinates
-            if station_info:
-                result.update({
-                    "latitude": station_info.get("latitude"),
-                    "longitude": station_info.get("longitude"),
-                    "name": station_info.get("name")
-                })
+        Returns:
+        - ObservationSeries with every observation in the window
+        """
+        store = self.observation_store
+        if store is None:
+            return self._fetch_series(station_id, parameter_id, start, end)
 
-            return result
+        try:
+            for missing_start, missing_end in store.missing_ranges(station_id, parameter_id, start, end):
+                series = self._fetch_series(station_id, parameter_id, missing_start, missing_end)
+                store.save(station_id, parameter_id, missing_start, missing_end, series)
+            return store.load(station_id, parameter_id, start, end)
+        except sqlite3.Error as e:
+            self.logger.error(f"Observation store unavailable, fetching from DMI: {str(e)}")
+            return self._fetch_series(station_id, parameter_id, start, end)
+
+    def _fetch_series(self, station_id: str, parameter_id: str, start: float, end: float) -> ObservationSeries:
+        """
+        Fetch the observation series of a station between two times from DMI
 
-        except Exception as e:
-            self.logger.error(f"Error fetching water level data: {str(e)}")
+        Parameters:
+        - station_id: The ID of the DMI water level station
+        - parameter_id: The parameter ID to fetch
+        - start: Start of the window in epoch seconds
+        - end: End of the window in epoch seconds
+
+        Returns:
+        - ObservationSeries with every observation in the window
+        """
+        params = {
+            "stationId": station_id,
+            "parameterId": parameter_id,
+            "datetime": f"{format_epoch(start)}/{format_epoch(end)}"
+        }
+
+        self.logger.info(f"Fetching water level data for station {station_id} for {params['datetime']}")
+        features = self._fetch_observation_features(params)
+
+        return ObservationSeries.from_features(features)
+
+    def _fetch_observation_features(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Fetch every observation matching a query, following DMI's offset pagination
+
+        Parameters:
+        - params: Observation query parameters (without limit, offset and API key)
+
+        Returns:
+        - List of observation GeoJSON features
+        """
+        url = f"{self.base_url}/collections/observation/items"
+        params = dict(params, limit=OBSERVATION_PAGE_SIZE, offset=0)
+        params["api-key"] = self.api_key
+
+        features = []
+        while True:
+            response = self.http.get(url, params=params)
+            response.raise_for_status()
+
+            page = json_backend.loads_observation_page(response.content).get("features", [])
+            features.extend(page)
+            if len(page) < OBSERVATION_PAGE_SIZE:
+                return features
+            params["offset"] += OBSERVATION_PAGE_SIZE
+
+    @staticmethod
+    def _split_windows(epochs: List[float]) -> List[Tuple[int, int]]:
+        """Split sorted times into (first index, last index) windows at gaps longer than OBSERVATION_MAX_GAP"""
+        max_gap = OBSERVATION_MAX_GAP.total_seconds()
+        windows = []
+        window_start = 0
+        for index in range(1, len(epochs)):
+            if epochs[index] - epochs[index - 1] > max_gap:
+                windows.append((window_start, index - 1))
+                window_start = index
+        windows.append((window_start, len(epochs) - 1))
+        return windows
+
+    def _build_water_level(self, station_id: str, parameter_id: str, timestamp_str: str,
+                           observation: Optional[Dict[str, Any]],
+                           station_info: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Build the water level result for a requested time from its closest observation"""
+        if observation is None:
+            self.logger.warning(f"No water level data found for station {station_id} at {timestamp_str}")
+            # Return station info with coordinates even if no water level data is found
+            if not station_info:
+                return None
+            observation = {"value": None, "observed": timestamp_str, "qcStatus": None}
+
+        result = {
+            "value": observation["value"],
+            "observed": observation["observed"],
+            "stationId": station_id,
+            "parameterId": parameter_id,
+            "qcStatus": observation["qcStatus"]
+        }
+
+        # Add station location coordinates
+        if station_info:
+            result.update({
+                "latitude": station_info.get("latitude"),
+                "longitude": station_info.get("longitude"),
+                "name": station_info.get("name")
+            })
+
+        return result
+
+    def _format_timestamp(self, timestamp: Union[str, datetime.datetime]) -> Optional[str]:
+        """Normalize a timestamp to YYYY-MM-DDTHH:MM:SSZ in UTC, or None if it cannot be parsed"""
+        try:
+            if isinstance(timestamp, datetime.datetime):
+                dt = timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=datetime.timezone.utc)
+            else:
+                dt = parse_timestamp(timestamp)
+            return dt.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        except (AttributeError, ValueError):
+            self.logger.error(f"Invalid timestamp format: {timestamp}")
             return None
 
-    def find_nearest_station(self, lon: float, lat: float) -> Optional[Dict[str, Any]]:
+    def find_nearest_station(self, lon: float, lat: float,
+                             max_distance: Optional[float] = None) -> Optional[Dict[str, Any]]:
         """
         Find the nearest water level station to a given coordinate
 
         Parameters:
         - lon: Longitude
         - lat: Latitude
+        - max_distance: Optional maximum distance in metres
 
         Returns:
-        - Dictionary with station information or None if not found
+        - Dictionary with station information and its distance in metres, or None if not found
         """
-        try:
-            # Make the API request to get all active stations
-            url = f"{self.base_url}/collections/station/items"
-            params = {
-                "status": "Active",
-                "limit": 100,  # Get more stations to ensure coverage
-                "api-key": self.api_key
-            }
+        stations = self.find_nearest_stations(lon, lat, 1, max_distance)
+        if not stations:
+            self.logger.warning("No water level stations found")
+            return None
+        return stations[0]
 
-            self.logger.info(f"Fetching water level stations near coordinates ({lon}, {lat})")
-            response = requests.get(url, params=params)
-            response.raise_for_status()
+    def find_nearest_stations(self, lon: float, lat: float, count: int = 1,
+                              max_distance: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Find the water level stations nearest to a given coordinate
 
-            # Parse the response
-            data = response.json()
-            features = data.get("features", [])
+        Parameters:
+        - lon: Longitude
+        - lat: Latitude
+        - count: Maximum number of stations to return
+        - max_distance: Optional maximum distance in metres
 
-            if not features:
-                self.logger.warning("No water level stations found")
-                return None
+        Returns:
+        - List of station dictionaries with their distance in metres, closest first
+        """
+        return self.find_nearest_stations_batch([(lon, lat)], count, max_distance)[0]
 
-            # Calculate distances and find the nearest station
-            nearest_station = None
-            min_distance = float('inf')
+    def find_nearest_stations_batch(self, points: List[Tuple[float, float]], count: int = 1,
+                                    max_distance: Optional[float] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Find the water level stations nearest to many coordinates in one vectorized lookup
 
-            for station in features:
-                # Get station coordinates
-                coordinates = station.get("geometry", {}).get("coordinates", [])
-                if len(coordinates) < 2:
-                    continue
+        Parameters:
+        - points: List of (lon, lat) tuples
+        - count: Maximum number of stations to return per point
+        - max_distance: Optional maximum distance in metres
 
-                station_lon, station_lat = coordinates
+        Returns:
+        - One list of station dictionaries with their distance in metres per point, closest first
+        """
+        try:
+            matches = self.station_catalogue.nearest_batch([point[0] for point in points],
+                                                           [point[1] for point in points], count, max_distance)
+        except Exception as e:
+            self.logger.error(f"Error finding nearest stations: {str(e)}")
+            return [[] for _ in points]
 
-                # Calculate distance (simple Euclidean distance is sufficient for small areas)
-                distance = ((station_lon - lon) ** 2 + (station_lat - lat) ** 2) ** 0.5
+        return [[station_match(station, distance) for station, distance in point_matches]
+                for point_matches in matches]
 
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest_station = station
+    def find_candidate_stations(self, points: List[Tuple[Optional[str], float, float]]) -> List[List[Dict[str, Any]]]:
+        """
+        Find the candidate water level stations for many Sentinel-2 images in one batch
 
-            if nearest_station:
-                return {
-                    "stationId": nearest_station.get("properties", {}).get("stationId"),
-                    "name": nearest_station.get("properties", {}).get("name"),
-                    "coordinates": nearest_station.get("geometry", {}).get("coordinates", []),
-                    "distance": min_distance,
-                    "parameterId": nearest_station.get("properties", {}).get("parameterId", [])
-                }
+        Images with a valid tile ID are looked up in the tile station table, assigning new tiles
+        from the centre of the tile (not of the image footprint, which may cover only part of it).
+        The others are resolved from their own centres with one batch nearest-station query.
+        Stations beyond the maximum station distance are left out.
 
-            return None
+        Parameters:
+        - points: List of (tile ID or None, centre longitude, centre latitude) tuples
 
+        Returns:
+        - One list of station dictionaries per point, closest first
+        """
+        try:
+            centers = {}
+            for tile_id, _, _ in points:
+                if tile_id and tile_id not in centers:
+                    centers[tile_id] = sentinel2_tiles.tile_center(tile_id)
+            centers = {tile_id: center for tile_id, center in centers.items() if center is not None}
+            tiles = self.tile_stations.assign_many(centers) if centers else {}
+
+            untiled = [index for index, (tile_id, _, _) in enumerate(points) if tile_id not in tiles]
+            matches = self.station_catalogue.nearest_batch(
+                [points[index][1] for index in untiled], [points[index][2] for index in untiled],
+                self.tile_stations.candidates)
+            untiled_stations = {
+                index: [station_match(station, distance) for station, distance in point_matches]
+                for index, point_matches in zip(untiled, matches)
+            }
         except Exception as e:
-            self.logger.error(f"Error finding nearest station: {str(e)}")
-            return None
+            self.logger.error(f"Error finding candidate stations: {str(e)}")
+            return [[] for _ in points]
+
+        results = []
+        for index, (tile_id, _, _) in enumerate(points):
+            stations = tiles[tile_id]["stations"] if tile_id in tiles else untiled_stations[index]
+            if self.max_station_distance is not None:
+                stations = [station for station in stations if station["distance"] <= self.max_station_distance]
+            results.append(list(stations))
+        return results
 
     def get_all_stations(self) -> List[Dict[str, Any]]:
         """
@@ -210,33 +475,15 @@ class WaterLevelService:
         - List of dictionaries with station information
         """
         try:
-            # Make the API request
-            url = f"{self.base_url}/collections/station/items"
-            params = {
-                "status": "Active",
-                "limit": 300,  # Get all stations
-                "api-key": self.api_key,
-                "type": "Tide-gauge-primary"
-            }
-
-            self.logger.info("Fetching all water level stations")
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-
-            # Parse the response
-            data = response.json()
-            features = data.get("features", [])
-
-            # Extract relevant station information
+            # Only primary tide gauges that report the DVR90 sea level
             stations = []
-            for station in features:
-                properties = station.get("properties", {})
-                if "sealev_dvr" in properties.get("parameterId", []):
+            for station in self.station_catalogue.stations():
+                if station.get("type") == "Tide-gauge-primary" and "sealev_dvr" in station.get("parameterId", []):
                     stations.append({
-                        "stationId": properties.get("stationId"),
-                        "name": properties.get("name"),
-                        "coordinates": station.get("geometry", {}).get("coordinates", []),
-                        "parameterId": properties.get("parameterId", [])
+                        "stationId": station.get("stationId"),
+                        "name": station.get("name"),
+                        "coordinates": station.get("coordinates", []),
+                        "parameterId": station.get("parameterId", [])
                     })
 
             return stations
@@ -245,40 +492,135 @@ class WaterLevelService:
             self.logger.error(f"Error fetching all stations: {str(e)}")
             return []
 
-    def _time_difference(self, time1_str: str, time2_str: str) -> float:
+    def get_all_station_levels_at_time(self, timestamp: Union[str, datetime.datetime],
+                                       parameter_id: str = "sealev_dvr") -> Dict[str, Optional[Dict[str, Any]]]:
         """
-        Calculate the absolute time difference between two timestamp strings in seconds
+        Get water level data from all stations at a specific time
+
+        All stations are covered by one observation query over the time window (or by the
+        observation store), and the closest reading per station is picked with NumPy.
 
         Parameters:
-        - time1_str: First timestamp in ISO format
-        - time2_str: Second timestamp in ISO format
+        - timestamp: The timestamp to get water level for (ISO format or datetime object)
+        - parameter_id: The parameter ID to fetch (default: sealev_dvr)
 
         Returns:
-        - Absolute time difference in seconds
+        - Dictionary mapping station ID to water level data or None; levels are None for
+          every station if DMI cannot be reached
         """
+        timestamp_str = self._format_timestamp(timestamp)
+        stations = self.get_all_stations()
+        if timestamp_str is None or not stations:
+            return {}
+
+        epoch = parse_timestamp(timestamp_str).timestamp()
+        tolerance = OBSERVATION_TOLERANCE.total_seconds()
+        start, end = epoch - tolerance, epoch + tolerance
+        station_ids = [station["stationId"] for station in stations]
+
         try:
-            time1 = datetime.datetime.fromisoformat(time1_str.replace('Z', '+00:00'))
-            time2 = datetime.datetime.fromisoformat(time2_str.replace('Z', '+00:00'))
-            return abs((time1 - time2).total_seconds())
-        except Exception:
-            # Return a large value if parsing fails
-            return float('inf')
+            rows = self._get_snapshot_rows(stations, parameter_id, start, end)
+        except Exception as e:
+            # Return the stations without levels rather than failing the whole snapshot
+            self.logger.error(f"Error fetching water level data for all stations: {str(e)}")
+            rows = []
+        with metrics.timed("snapshot_match"):
+            closest = self._closest_per_station(rows, epoch, tolerance)
 
-    def get_all_station_levels_at_time(self, timestamp: Union[str, datetime.datetime]):
+        station_levels = {}
+        for station_id in station_ids:
+            station_levels[station_id] = self._build_water_level(
+                station_id, parameter_id, timestamp_str, closest.get(station_id),
+                self._get_station_by_id(station_id))
+
+        return station_levels
+
+    def _get_snapshot_rows(self, stations: List[Dict[str, Any]], parameter_id: str,
+                           start: float, end: float) -> List[Tuple[str, int, Optional[float], Optional[str]]]:
         """
-        Get water level data from all stations at a specific time
+        Get the observations of all given stations in a time window
 
         Parameters:
-        - timestamp: The timestamp to get water level for (ISO format or datetime object)
+        - stations: Stations to cover
+        - parameter_id: The parameter ID to fetch
+        - start: Start of the window in epoch seconds
+        - end: End of the window in epoch seconds
 
         Returns:
-        - Dictionary with all station water level data at the specified time
+        - List of (station_id, observed epoch seconds, value, qcStatus) rows
         """
-        stations = self.get_all_stations(datetime=timestamp)
-        station_levels = {}
+        station_ids = [station["stationId"] for station in stations]
+        store = self.observation_store
 
-        for station in stations:
-            level = self.get_water_level_at_time(station['stationId'], timestamp)
-            station_levels[station['stationId']] = level
+        try:
+            if store is not None and not any(store.missing_ranges(station_id, parameter_id, start, end)
+                                             for station_id in station_ids):
+                return store.load_stations(station_ids, parameter_id, start, end)
+        except sqlite3.Error as e:
+            self.logger.error(f"Observation store unavailable, fetching from DMI: {str(e)}")
+            store = None
+
+        # One query for every station inside the bounding box of the catalogue
+        lons = [station["coordinates"][0] for station in stations]
+        lats = [station["coordinates"][1] for station in stations]
+        params = {
+            "parameterId": parameter_id,
+            "datetime": f"{format_epoch(start)}/{format_epoch(end)}",
+            "bbox": f"{min(lons)},{min(lats)},{max(lons)},{max(lats)}"
+        }
+        self.logger.info(f"Fetching water level data for all stations for {params['datetime']}")
+        features = self._fetch_observation_features(params)
+
+        wanted = set(station_ids)
+        features_by_station = {station_id: [] for station_id in station_ids}
+        for feature in features:
+            station_id = feature.get("properties", {}).get("stationId")
+            if station_id in wanted:
+                features_by_station[station_id].append(feature)
+
+        rows = []
+        for station_id, station_features in features_by_station.items():
+            series = ObservationSeries.from_features(station_features)
+            if store is not None:
+                try:
+                    store.save(station_id, parameter_id, start, end, series)
+                except sqlite3.Error as e:
+                    self.logger.error(f"Error storing observations for station {station_id}: {str(e)}")
+            rows.extend(
+                (station_id, int(observed), None if np.isnan(value) else float(value), qc_status)
+                for observed, value, qc_status in zip(series.times, series.values, series.qc_statuses)
+            )
+
+        return rows
+
+    @staticmethod
+    def _closest_per_station(rows: List[Tuple[str, int, Optional[float], Optional[str]]], epoch: float,
+                             tolerance: float) -> Dict[str, Dict[str, Any]]:
+        """
+        Pick the observation closest to a time for every station
 
-        return station_levels
+        Parameters:
+        - rows: List of (station_id, observed epoch seconds, value, qcStatus) rows
+        - epoch: Requested time in epoch seconds
+        - tolerance: Maximum allowed distance in seconds
+
+        Returns:
+        - Dictionary mapping station ID to its closest observation
+        """
+        if not rows:
+            return {}
+
+        station_ids = np.array([row[0] for row in rows])
+        distances = np.abs(np.array([row[1] for row in rows], dtype=np.int64) - epoch)
+
+        # Sort by station, then by distance, and keep the first row of each station
+        order = np.lexsort((distances, station_ids))
+        _, first = np.unique(station_ids[order], return_index=True)
+        best = order[first]
+        best = best[distances[best] <= tolerance]
+
+        closest = {}
+        for index in best:
+            station_id, observed, value, qc_status = rows[index]
+            closest[station_id] = {"observed": format_epoch(observed), "value": value, "qcStatus": qc_status}
+        return closest
@@ -109,6 +109,9 @@ let searchState = {
 let searchResults = [];
 let waterLevelStations = [];
 
+// Longest search URL sent as a GET request; larger geometries are POSTed
+const MAX_GET_URL_LENGTH = 2000;
+
 // Function to check if elements exist in the DOM
 function elementExists(element) {
     return element !== null && element !== undefined;
@@ -325,17 +328,25 @@ function performSearch(page = 1) {
         page: searchState.currentPage,
         limit: searchState.resultsPerPage,
         sort_by: searchState.sortBy,
-        sort_direction: searchState.sortDirection
+        sort_direction: searchState.sortDirection,
+        lazy: true  // Water levels are fetched after the results are shown
     };
 
-    // Call the API to search for images
-    fetch('/api/search_images', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify(searchParams)
-    })
+    // Call the API to search for images. Searches that fit in a URL are sent as GET requests,
+    // so the browser can answer repeated searches from its cache or revalidate them with a 304.
+    const query = JSON.stringify(searchParams);
+    const searchUrl = `/api/search_images?query=${encodeURIComponent(query)}`;
+    const searchRequest = searchUrl.length <= MAX_GET_URL_LENGTH
+        ? fetch(searchUrl)
+        : fetch('/api/search_images', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: query
+        });
+
+    searchRequest
     .then(response => {
         if (!response.ok) {
             throw new Error(`Server responded with ${response.status}: ${response.statusText}`);
@@ -380,6 +391,11 @@ function performSearch(page = 1) {
                 resultsModalCount.textContent = `${searchState.totalResults} images (showing ${searchState.currentPage * searchState.resultsPerPage - searchState.resultsPerPage + 1}-${Math.min(searchState.currentPage * searchState.resultsPerPage, searchState.totalResults)})`;
             }
         }
+
+        // Fill in the water levels once they are available
+        if (data.enrichment_token) {
+            fetchWaterLevels(data.enrichment_token, searchResults);
+        }
     })
     .catch(error => {
         console.error('Error:', error);
@@ -397,6 +413,35 @@ function performSearch(page = 1) {
     });
 }
 
+// Fetch the water levels of a lazily searched page and update the results table
+function fetchWaterLevels(token, images) {
+    fetch(`/api/search_images/enrich/${token}`)
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`Server responded with ${response.status}: ${response.statusText}`);
+        }
+        return response.json();
+    })
+    .then(data => {
+        // Ignore the response if a newer search has replaced the results
+        if (images !== searchResults) {
+            return;
+        }
+
+        const waterLevels = data.waterLevels || {};
+        images.forEach(image => {
+            if (waterLevels[image.id]) {
+                image.waterLevel = waterLevels[image.id];
+            }
+        });
+
+        populateResultsTable(searchResults);
+    })
+    .catch(error => {
+        console.error('Error fetching water levels:', error);
+    });
+}
+
 // Handle search button click
 if (searchButton) {
     searchButton.addEventListener('click', function() {
@@ -676,75 +721,40 @@ function exportResults() {
     }
 }
 
-// Function to fetch all pages for export
+// Function to export all pages through the streaming export endpoint
 function fetchAllPagesForExport() {
-    // Create a copy of the search state with a large limit to minimize requests
     const exportSearchParams = {
         geometry: searchState.geometry,
         start_date: searchState.startDate,
         end_date: searchState.endDate,
         max_cloud_coverage: searchState.maxCloudCoverage,
-        page: 1,
         limit: 1000, // Maximum allowed by the API
         sort_by: searchState.sortBy,
-        sort_direction: searchState.sortDirection
+        sort_direction: searchState.sortDirection,
+        format: 'csv'
     };
 
-    let allResults = [];
-    let currentPage = 1;
-    let hasNextPage = true;
+    // Submit a form so the browser streams the CSV straight to a download
+    // instead of holding every page in memory
+    const form = document.createElement('form');
+    form.method = 'POST';
+    form.action = '/api/search_images/export';
+    form.style.display = 'none';
 
-    // Define the recursive function to fetch pages
-    function fetchNextPage() {
-        exportSearchParams.page = currentPage;
+    const queryField = document.createElement('input');
+    queryField.type = 'hidden';
+    queryField.name = 'query';
+    queryField.value = JSON.stringify(exportSearchParams);
+    form.appendChild(queryField);
 
-        fetch('/api/search_images', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(exportSearchParams)
-        })
-        .then(response => {
-            if (!response.ok) {
-                throw new Error(`Server responded with ${response.status}: ${response.statusText}`);
-            }
-            return response.json();
-        })
-        .then(data => {
-            // Add the images from this page to our collection
-            allResults = allResults.concat(data.images || []);
-
-            // Check if there are more pages
-            hasNextPage = data.pagination && data.pagination.next;
-
-            if (hasNextPage) {
-                // If there are more pages, fetch the next one
-                currentPage++;
-                fetchNextPage();
-            } else {
-                // If no more pages, export the results
-                exportToCSV(allResults);
-
-                // Hide loading indicator
-                if (elementExists(loadingIndicator)) {
-                    loadingIndicator.style.display = 'none';
-                }
-            }
-        })
-        .catch(error => {
-            console.error('Error fetching all pages:', error);
-            alert(`Error fetching all results for export: ${error.message}`);
+    document.body.appendChild(form);
+    form.submit();
+    document.body.removeChild(form);
 
-            // Hide loading indicator
-            if (elementExists(loadingIndicator)) {
-                loadingIndicator.style.display = 'none';
-            }
-        });
+    // Hide loading indicator
+    if (elementExists(loadingIndicator)) {
+        loadingIndicator.style.display = 'none';
     }
-
-    // Start fetching pages
-    fetchNextPage();
 }
 
 // Function to export results to CSV
@@ -805,6 +815,12 @@ function truncateText(text, maxLength) {
     return text.slice(0, maxLength) + '...';
 }
 
+// URL of an image preview through the server-side preview cache, optionally downscaled
+function previewUrl(imageId, size) {
+    const id = encodeURIComponent(imageId.replace(/\.SAFE$/, ''));
+    return size ? `/api/preview/${id}?size=${size}` : `/api/preview/${id}`;
+}
+
 // Function to show image preview in modal
 function showPreview(url, imageId) {
     // Set the image source
@@ -1016,15 +1032,9 @@ function viewImageDetails(imageId) {
                                                 </table>
                                             </div>
                                             <div class="col-md-6">
-                                                ${details.assets?.preview?.href ?
-                                                    `<img src="${details.assets.preview.href}" class="img-fluid rounded" alt="Preview"
-                                                         onclick="showPreview('${details.assets.preview.href}', '${details.id}')">` :
-                                                    details.assets?.thumbnail?.href ?
-                                                    `<img src="${details.assets.thumbnail.href}" class="img-fluid rounded" alt="Thumbnail"
-                                                         onclick="showPreview('${details.assets.thumbnail.href}', '${details.id}')">` :
-                                                    details.assets?.overview?.href ?
-                                                    `<img src="${details.assets.overview.href}" class="img-fluid rounded" alt="Overview"
-                                                         onclick="showPreview('${details.assets.overview.href}', '${details.id}')">` :
+                                                ${details.assets?.preview?.href || details.assets?.thumbnail?.href || details.assets?.overview?.href ?
+                                                    `<img src="${previewUrl(details.id, 'medium')}" class="img-fluid rounded" alt="Preview"
+                                                         onclick="showPreview('${previewUrl(details.id)}', '${details.id}')">` :
                                                     '<div class="alert alert-info">No preview available</div>'
                                                 }
                                             </div>
@@ -1065,7 +1075,7 @@ function viewImageDetails(imageId) {
                                                                 </tr>
                                                                 <tr>
                                                                     <th scope="row">Distance from Image Center</th>
-                                                                    <td>${waterLevel.stationDistance ? (waterLevel.stationDistance * 111).toFixed(2) + ' km (approx.)' : 'N/A'}</td>
+                                                                    <td>${waterLevel.stationDistance ? (waterLevel.stationDistance / 1000).toFixed(2) + ' km' : 'N/A'}</td>
                                                                 </tr>
                                                             </tbody>
                                                         </table>
@@ -1269,8 +1279,8 @@ function populateResultsTable(images) {
         row.innerHTML = `
             <td>
                 ${image.preview_url
-                    ? `<img src="${image.preview_url}" class="preview-thumbnail"
-                         alt="Preview" onclick="showPreview('${image.preview_url}', '${image.id}')">`
+                    ? `<img src="${previewUrl(image.id, 'small')}" class="preview-thumbnail"
+                         alt="Preview" onclick="showPreview('${previewUrl(image.id)}', '${image.id}')">`
                     : '<div class="text-center text-muted"><i class="bi bi-image"></i> No preview</div>'
                 }
             </td>
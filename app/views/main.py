@@ -1,15 +1,94 @@
 # app/views/main.py
-from flask import Blueprint, render_template, current_app, request, jsonify, url_for, redirect
+import atexit
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+import time
+
+from flask import (Blueprint, Response, g, render_template, current_app, request, jsonify, url_for, redirect,
+                   send_file, stream_with_context)
+from shapely.geometry import shape
 
 # Import services
+from app.services import json_backend, metrics
+from app.services.image_record import dumps, parse_datetime
 from app.services.stac_service import STACService
+from app.services.observation_store import ObservationStore
+from app.services.preview_cache import PreviewCache, can_downscale, content_type, downscale
 from app.services.water_level_service import WaterLevelService
 
+try:
+    import brotli
+except ImportError:  # Brotli compression is optional, gzip is always available
+    brotli = None
+
 main_bp = Blueprint('main', __name__)
 stac_service = STACService()
 water_level_service = WaterLevelService()
 
 
+@main_bp.record_once
+def configure_services(state):
+    """Apply application configuration to the shared services once, when the blueprint is registered"""
+    config = state.app.config
+    json_backend.set_backend(config.get('JSON_BACKEND', 'auto'))
+    water_level_service.set_station_cache_ttl(config.get('STATION_CATALOGUE_TTL', 3600))
+    water_level_service.set_max_workers(config.get('ENRICHMENT_MAX_WORKERS', 8))
+    stac_service.set_max_workers(config.get('ENRICHMENT_MAX_WORKERS', 8))
+
+    store_path = config.get('OBSERVATION_STORE_PATH')
+    if store_path is None:
+        store_path = os.path.join(state.app.instance_path, 'observations.sqlite')
+    if store_path:
+        final_after = config.get('OBSERVATION_FINAL_AFTER_DAYS', 30) * 24 * 3600
+        water_level_service.set_observation_store(ObservationStore(store_path, final_after=final_after))
+
+    tile_index_path = config.get('TILE_STATION_INDEX_PATH')
+    if tile_index_path is None:
+        tile_index_path = os.path.join(state.app.instance_path, 'tile_stations.json')
+    water_level_service.set_tile_station_index(tile_index_path or None, config.get('TILE_STATION_CANDIDATES', 3))
+    water_level_service.set_max_station_distance(config.get('STATION_MAX_DISTANCE'))
+    # Write pending tile assignments when the worker exits
+    atexit.register(water_level_service.tile_stations.flush)
+
+    preview_path = config.get('PREVIEW_CACHE_PATH') or os.path.join(state.app.instance_path, 'previews')
+    stac_service.set_preview_cache(PreviewCache(preview_path, config.get('PREVIEW_CACHE_MAX_BYTES', 512 * 1024 * 1024)))
+    stac_service.set_refill_max_pages(config.get('SEARCH_REFILL_MAX_PAGES', 10))
+
+    stac_service.configure_search_cache(
+        max_entries=config.get('SEARCH_CACHE_MAX_ENTRIES', 256),
+        recent_ttl=config.get('SEARCH_CACHE_RECENT_TTL', 300),
+        historic_ttl=config.get('SEARCH_CACHE_HISTORIC_TTL', 7 * 24 * 3600),
+        bbox_tolerance=config.get('SEARCH_CACHE_BBOX_TOLERANCE', 0.001),
+        redis_url=config.get('REDIS_URL')
+    )
+    stac_service.configure_enrichment_tokens(config.get('SECRET_KEY'))
+    stac_service.configure_item_asset_cache(
+        max_entries=config.get('ITEM_ASSET_CACHE_MAX_ENTRIES', 4096),
+        ttl=config.get('ITEM_ASSET_CACHE_TTL', 30 * 24 * 3600),
+        redis_url=config.get('REDIS_URL')
+    )
+    stac_service.configure_search_fallback(
+        failure_threshold=config.get('STAC_BREAKER_FAILURE_THRESHOLD', 3),
+        reset_timeout=config.get('STAC_BREAKER_RESET_TIMEOUT', 300),
+        probe_interval=config.get('STAC_PROBE_INTERVAL', 60)
+    )
+
+    http_options = {
+        "pool_maxsize": config.get('HTTP_POOL_MAXSIZE', 10),
+        "max_retries": config.get('HTTP_MAX_RETRIES', 3),
+        "backoff_factor": config.get('HTTP_BACKOFF_FACTOR', 0.5)
+    }
+    connect_timeout = config.get('HTTP_CONNECT_TIMEOUT', 5)
+    stac_service.http.configure(timeout=(connect_timeout, config.get('STAC_READ_TIMEOUT', 60)), **http_options)
+    water_level_service.http.configure(timeout=(connect_timeout, config.get('DMI_READ_TIMEOUT', 30)),
+                                       **http_options)
+
+
 # Initialize services
 @main_bp.before_app_request
 def setup_services():
@@ -25,46 +104,312 @@ def setup_services():
     stac_service.set_water_level_service(water_level_service)
 
 
-@main_bp.route('/api/search_images', methods=['POST'])
+@main_bp.before_app_request
+def start_request_trace():
+    """Trace upstream calls and timed sections of the request"""
+    g.trace_token = metrics.start_trace()
+
+
+@main_bp.after_app_request
+def add_server_timing(response):
+    """Report the request trace in a Server-Timing header and the request latency in the metrics"""
+    trace = metrics.current_trace()
+    if trace is None:
+        return response
+
+    response.headers['Server-Timing'] = trace.server_timing()
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.registry.observe('shore_http_request_duration_seconds', {'endpoint': endpoint, 'method': request.method},
+                             time.perf_counter() - trace.started, help_text="Latency of API requests")
+    metrics.registry.inc('shore_http_requests_total',
+                         {'endpoint': endpoint, 'method': request.method, 'status': str(response.status_code)},
+                         help_text="API requests by endpoint and status")
+    return response
+
+
+@main_bp.teardown_app_request
+def end_request_trace(exception=None):
+    """End the request trace"""
+    token = g.pop('trace_token', None)
+    if token is not None:
+        metrics.end_trace(token)
+
+
+# Responses of these types are compressed; images and other binary files are sent as they are
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/html', 'text/plain', 'text/csv'}
+
+
+@main_bp.after_app_request
+def compress_response(response):
+    """
+    Validate and compress buffered text responses
+
+    GET responses get a weak ETag from a hash of their content, so browsers revalidate with
+    If-None-Match and receive a 304 without a body when nothing changed. Bodies above
+    COMPRESSION_MIN_BYTES are then compressed with brotli (if installed) or gzip, whichever the
+    client prefers. Streamed responses and files are left alone.
+    """
+    if response.direct_passthrough or response.is_streamed or response.status_code != 200 \
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if request.method in ('GET', 'HEAD'):
+        # The hash covers the uncompressed body, hence weak: it matches every encoding of it
+        response.add_etag(weak=True)
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    data = response.get_data()
+    if len(data) < current_app.config.get('COMPRESSION_MIN_BYTES', 1024):
+        return response
+
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli else ['gzip'])
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=current_app.config.get('BROTLI_QUALITY', 5)))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(data, compresslevel=current_app.config.get('GZIP_LEVEL', 6)))
+    else:
+        return response
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def cache_control(response, max_age):
+    """Let browsers and proxies keep a response for `max_age` seconds, or not at all if it is 0"""
+    response.headers['Cache-Control'] = f'public, max-age={int(max_age)}' if max_age > 0 else 'no-store'
+    return response
+
+
+def parse_search_params(data):
+    """Extract the search parameters shared by the search endpoints from a request payload"""
+    return {
+        "start_date": data.get('start_date'),
+        "end_date": data.get('end_date'),
+        "max_cloud_coverage": int(data.get('max_cloud_coverage', 20)),
+        "sort_by": data.get('sort_by', 'datetime'),
+        "sort_direction": data.get('sort_direction', 'desc')
+    }
+
+
+def json_response(result):
+    """Return search results as JSON, with the image records written straight to the response text"""
+    return Response(dumps(result), mimetype='application/json')
+
+
+@main_bp.route('/api/search_images', methods=['GET', 'POST'])
 def search_images():
-    """API endpoint to search for images based on a geometry"""
+    """
+    API endpoint to search for images based on a geometry
+
+    The search is sent as a JSON body, or as JSON in the `query` parameter of a GET request so
+    browsers can cache the results: long for historic date ranges, briefly for recent ones.
+    """
     # Get request data
-    data = request.json
+    if request.method == 'GET':
+        try:
+            data = json.loads(request.args.get('query', ''))
+        except ValueError:
+            data = None
+    else:
+        data = request.get_json(silent=True)
     if not data or 'geometry' not in data:
         return jsonify({"error": "Missing geometry data"}), 400
 
-    # Process search parameters
-    geometry = data.get('geometry')
-    start_date = data.get('start_date')
-    end_date = data.get('end_date')
-    max_cloud_coverage = int(data.get('max_cloud_coverage', 20))
-
     # Get pagination parameters
     page = int(data.get('page', 1))
     limit = int(data.get('limit', 20))
-    sort_by = data.get('sort_by', 'datetime')
-    sort_direction = data.get('sort_direction', 'desc')
+
+    # Lazy searches return the images right away and leave water levels to the enrich endpoint
+    lazy = bool(data.get('lazy', False))
 
     # Search for images using STAC API
     result = stac_service.search_images(
-        geometry,
-        start_date=start_date,
-        end_date=end_date,
-        max_cloud_coverage=max_cloud_coverage,
+        data.get('geometry'),
         page=page,
         limit=limit,
-        sort_by=sort_by,
-        sort_direction=sort_direction
+        enrich=not lazy,
+        **parse_search_params(data)
+    )
+
+    # Enrichment tokens are derived from the search, so lazy pages are cached and revalidated like
+    # enriched ones
+    max_age = 0 if result.get('error') else stac_service.get_search_max_age(data.get('end_date'))
+    return cache_control(json_response(result), max_age)
+
+
+@main_bp.route('/api/search_images/enrich/<token>')
+def enrich_search_images(token):
+    """API endpoint to get the water levels of a page returned by a lazy search"""
+    water_levels = stac_service.enrich_search_page(token)
+    if water_levels is None:
+        return jsonify({"error": "Invalid enrichment token"}), 404
+
+    return jsonify({"waterLevels": water_levels})
+
+
+EXPORT_COLUMNS = ['ID', 'Date', 'Cloud Coverage', 'Sun Elevation', 'Sun Azimuth',
+                  'Water Level', 'Station ID', 'Station Name', 'Preview URL']
+
+
+def export_row(image):
+    """Flatten an image record into the columns of the CSV export"""
+    water_level = image.water_level or {}
+    return [
+        image.id,
+        image.date,
+        image.cloud_coverage,
+        image.sun_elevation,
+        image.sun_azimuth,
+        water_level.get('value'),
+        water_level.get('stationId'),
+        water_level.get('stationName'),
+        image.preview_url
+    ]
+
+
+@main_bp.route('/api/search_images/export', methods=['POST'])
+def export_search_images():
+    """Stream all results of a search as CSV or NDJSON, one upstream page at a time"""
+    # Accept a JSON body, or a form field so browsers can download the stream natively
+    data = request.get_json(silent=True)
+    if data is None:
+        try:
+            data = json.loads(request.form['query'])
+        except (KeyError, ValueError):
+            data = None
+    if not data or 'geometry' not in data:
+        return jsonify({"error": "Missing geometry data"}), 400
+
+    export_format = data.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({"error": "Unsupported export format"}), 400
+
+    pages = stac_service.iter_search_pages(
+        data.get('geometry'),
+        limit=int(data.get('limit', 1000)),
+        **parse_search_params(data)
+    )
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for images in pages:
+            for image in images:
+                writer.writerow(export_row(image))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        # Flush the header if there were no results at all
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def generate_ndjson():
+        for images in pages:
+            yield ''.join(image.to_json() + '\n' for image in images)
+
+    if export_format == 'ndjson':
+        return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson',
+                        headers={'Content-Disposition': 'attachment; filename=sentinel_search_results.ndjson'})
+
+    return Response(stream_with_context(generate_csv()), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=sentinel_search_results.csv'})
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+def sse_response(events):
+    """Stream Server-Sent Events; the generator stops as soon as the client disconnects"""
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@main_bp.route('/api/search_images/stream')
+def stream_search_images():
+    """
+    Stream all results of a search as Server-Sent Events
+
+    The search is passed as JSON in the `query` parameter, since EventSource only sends GET
+    requests. Each page is sent as an `images` event as soon as it is fetched, followed by
+    `waterLevels` events as each station's observations arrive, with a `progress` event after
+    every step. Closing the connection stops the search before the next upstream call.
+    """
+    try:
+        data = json.loads(request.args.get('query', ''))
+    except ValueError:
+        data = None
+    if not data or 'geometry' not in data:
+        return jsonify({"error": "Missing geometry data"}), 400
+
+    results = stac_service.iter_search_results(
+        data.get('geometry'),
+        limit=int(data.get('limit', 1000)),
+        enrich=False,
+        **parse_search_params(data)
     )
 
-    return jsonify(result)
+    def generate():
+        progress = {"pages": 0, "images": 0, "total": 0, "enriched": 0, "percent": 0}
+        try:
+            for result in results:
+                images = result["images"]
+                progress["pages"] += 1
+                progress["images"] += len(images)
+                progress["total"] = max(result["pagination"].get("total", 0), progress["images"])
+                progress["percent"] = round(100 * progress["images"] / progress["total"]) if progress["total"] else 100
+                # Pages served from the search cache already have their water levels. Records are
+                # shared with the cache, so the others are enriched as copies.
+                pending = [image.copy() for image in images if image.water_level is None]
+                progress["enriched"] += len(images) - len(pending)
+                yield sse_event('images', {"images": images, "pagination": result["pagination"]})
+                yield sse_event('progress', progress)
+
+                for enriched in stac_service.iter_water_level_enrichment(pending):
+                    progress["enriched"] += len(enriched)
+                    yield sse_event('waterLevels', {"waterLevels": {image.id: image.water_level
+                                                                    for image in enriched}})
+                    yield sse_event('progress', progress)
+
+            progress["percent"] = 100
+            yield sse_event('done', progress)
+        except Exception as e:
+            current_app.logger.error(f"Error streaming search results: {str(e)}")
+            yield sse_event('error', {"error": str(e)})
+
+    return sse_response(generate())
 
 
 @main_bp.route('/api/image_details/<image_id>')
 def image_details(image_id):
     """Get detailed information about a specific image"""
     details = stac_service.get_image_details(image_id)
-    return jsonify(details)
+    return cache_control(jsonify(details), image_details_max_age(details))
+
+
+def image_details_max_age(details):
+    """
+    Return how long the details of an image may be cached
+
+    Published items do not change, but the water levels attached to them can until DMI's
+    observations are final, so only images older than OBSERVATION_FINAL_AFTER_DAYS are kept long.
+    """
+    datetime_str = details.get('properties', {}).get('datetime')
+    if not datetime_str:
+        return 0  # Not found or failed, try again next time
+
+    config = current_app.config
+    date = datetime.datetime.fromisoformat(parse_datetime(datetime_str)[0])
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    age = datetime.datetime.now(datetime.timezone.utc) - date
+    if age > datetime.timedelta(days=config.get('OBSERVATION_FINAL_AFTER_DAYS', 30)):
+        return config.get('SEARCH_CACHE_HISTORIC_TTL', 7 * 24 * 3600)
+    return config.get('SEARCH_CACHE_RECENT_TTL', 300)
 
 
 @main_bp.route('/api/download_links/<image_id>')
@@ -75,6 +420,110 @@ def download_links(image_id):
     return jsonify({"links": links})
 
 
+def parse_image_ids(data):
+    """Extract the list of image IDs from a batch request payload, or None if it is missing or invalid"""
+    image_ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(image_ids, list) or not image_ids or not all(isinstance(i, str) for i in image_ids):
+        return None
+    return image_ids
+
+
+@main_bp.route('/api/image_details', methods=['POST'])
+def images_details():
+    """Get detailed information about many images, given as a list of `ids`"""
+    image_ids = parse_image_ids(request.get_json(silent=True))
+    if image_ids is None:
+        return jsonify({"error": "Missing image ids"}), 400
+
+    return jsonify({"images": stac_service.get_images_details(image_ids)})
+
+
+@main_bp.route('/api/download_links', methods=['POST'])
+def download_links_batch():
+    """Get download links for many images, given as a list of `ids` with optional `bands`"""
+    data = request.get_json(silent=True)
+    image_ids = parse_image_ids(data)
+    if image_ids is None:
+        return jsonify({"error": "Missing image ids"}), 400
+
+    bands = data.get('bands') or ['B04', 'B03', 'B02']
+    return jsonify({"links": stac_service.get_download_links_batch(image_ids, bands)})
+
+
+# Longest edge in pixels of the downscaled preview sizes
+PREVIEW_SIZES = {'small': 256, 'medium': 768}
+# Previews of a product never change, so browsers may keep them for a year
+PREVIEW_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+@main_bp.route('/api/preview/<image_id>')
+def preview(image_id):
+    """
+    Proxy the preview image of a product through the on-disk preview cache
+
+    The optional `size` parameter (small or medium) returns a downscaled copy when Pillow is
+    installed. The first request streams the original through while storing it.
+    """
+    size = request.args.get('size', 'original')
+    if size != 'original' and size not in PREVIEW_SIZES:
+        return jsonify({"error": "Unsupported preview size"}), 400
+    if not can_downscale():
+        size = 'original'
+
+    key = f"{image_id}:{size}"
+    etag = hashlib.sha1(key.encode()).hexdigest()
+    if etag in request.if_none_match:
+        return Response(status=304, headers={'ETag': f'"{etag}"', 'Cache-Control': PREVIEW_CACHE_CONTROL})
+
+    cache = stac_service.preview_cache
+    path = cache.get(key)
+    if path:
+        return preview_response(path, content_type(path), etag)
+
+    href = stac_service.get_preview_href(image_id)
+    if not href:
+        return jsonify({"error": "No preview available"}), 404
+
+    original_key = f"{image_id}:original"
+    original_path = cache.get(original_key) if size != 'original' else None
+    if original_path is None:
+        try:
+            upstream = stac_service.http.get(href, stream=True)
+            upstream.raise_for_status()
+        except Exception as e:
+            current_app.logger.error(f"Error fetching preview {image_id}: {str(e)}")
+            return jsonify({"error": "Preview not available upstream"}), 502
+
+        if size == 'original':
+            def generate():
+                try:
+                    yield from cache.stream_into(original_key, upstream.iter_content(64 * 1024))
+                finally:
+                    upstream.close()
+
+            return Response(stream_with_context(generate()),
+                            mimetype=upstream.headers.get('Content-Type', 'application/octet-stream'),
+                            headers={'ETag': f'"{etag}"', 'Cache-Control': PREVIEW_CACHE_CONTROL})
+
+        with upstream:
+            original_path = cache.put(original_key, upstream.content)
+
+    try:
+        data, mimetype = downscale(original_path, PREVIEW_SIZES[size])
+    except Exception as e:
+        current_app.logger.error(f"Error downscaling preview {image_id}: {str(e)}")
+        return preview_response(original_path, content_type(original_path), etag)
+
+    return preview_response(cache.put(key, data), mimetype, etag)
+
+
+def preview_response(path, mimetype, etag):
+    """Send a cached preview with headers that let browsers keep it"""
+    response = send_file(path, mimetype=mimetype, etag=etag, conditional=True)
+    response.headers['Cache-Control'] = PREVIEW_CACHE_CONTROL
+    return response
+
+
 @main_bp.route('/api/water_level_stations')
 def water_level_stations():
     """Get all water level stations"""
@@ -91,7 +540,9 @@ def water_level_stations():
 
         processed_stations.append(station)
 
-    return jsonify({"stations": processed_stations})
+    # The station list only changes when the catalogue is refreshed
+    max_age = current_app.config.get('STATION_CATALOGUE_TTL', 3600) if processed_stations else 0
+    return cache_control(jsonify({"stations": processed_stations}), max_age)
 
 
 @main_bp.route('/api/water_level_at_time', methods=['GET'])
@@ -102,69 +553,236 @@ def water_levels_for_all_stations():
         return jsonify({"error": "Missing time parameter"}), 400
 
     try:
-        # Get all stations
-        stations = water_level_service.get_all_stations()
-
-        # Filter stations to only include those with valid coordinates
-        valid_stations = []
-        for station in stations:
-            # Extract coordinates
-            if 'coordinates' in station and isinstance(station['coordinates'], list) and len(
-                    station['coordinates']) >= 2:
-                station['longitude'] = station['coordinates'][0]
-                station['latitude'] = station['coordinates'][1]
-                valid_stations.append(station)
-            elif 'longitude' in station and 'latitude' in station:
-                valid_stations.append(station)
-
-        # Get water level for each station at the specified time
-        station_levels = []
-        for station in valid_stations:
-            station_id = station.get('stationId') or station.get('id')
-
-            if not station_id:
-                continue  # Skip stations without an ID
-
-            water_level = water_level_service.get_water_level_at_time(
-                station_id=station_id,
-                timestamp=time_str,
-                parameter_id='sealev_dvr'  # Danish Vertical Reference 1990
-            )
-
-            # Create station data entry even if water level is null
-            station_data = {
-                'stationId': station_id,
-                'waterLevel': water_level.get('value') if water_level else None,
-                'timestamp': water_level.get('observed') if water_level else time_str,
-                'latitude': station.get('latitude'),
-                'longitude': station.get('longitude'),
-                'name': station.get('name', 'Unnamed Station')
-            }
-            station_levels.append(station_data)
-
-        return jsonify({"stationLevels": station_levels})
+        stations = valid_stations(water_level_service.get_all_stations())
+
+        # Get water levels for all stations at the specified time in one pass
+        levels = water_level_service.get_all_station_levels_at_time(time_str, parameter_id='sealev_dvr')
+
+        return jsonify({"stationLevels": build_station_levels(stations, levels, time_str)})
     except Exception as e:
         current_app.logger.error(f"Error getting water levels: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
+@main_bp.route('/api/water_level_at_time/stream', methods=['GET'])
+def stream_water_levels_for_all_stations():
+    """
+    Stream the water levels for all stations at a specific time as Server-Sent Events
+
+    A `stations` event with the resolved stations (without levels) is sent first so they can
+    be drawn while the observations are fetched, followed by `stationLevels` and `done`.
+    """
+    time_str = request.args.get('time')
+    if not time_str:
+        return jsonify({"error": "Missing time parameter"}), 400
+
+    def generate():
+        try:
+            stations = valid_stations(water_level_service.get_all_stations())
+            yield sse_event('stations', {"stationLevels": build_station_levels(stations, {}, time_str)})
+            yield sse_event('progress', {"stations": len(stations), "percent": 50})
+
+            levels = water_level_service.get_all_station_levels_at_time(time_str, parameter_id='sealev_dvr')
+            yield sse_event('stationLevels', {"stationLevels": build_station_levels(stations, levels, time_str)})
+            yield sse_event('done', {"stations": len(stations), "percent": 100})
+        except Exception as e:
+            current_app.logger.error(f"Error streaming water levels: {str(e)}")
+            yield sse_event('error', {"error": str(e)})
+
+    return sse_response(generate())
+
+
+def valid_stations(stations):
+    """Filter stations to only include those with valid coordinates, adding latitude and longitude"""
+    valid = []
+    for station in stations:
+        # Extract coordinates
+        if 'coordinates' in station and isinstance(station['coordinates'], list) and len(
+                station['coordinates']) >= 2:
+            station['longitude'] = station['coordinates'][0]
+            station['latitude'] = station['coordinates'][1]
+            valid.append(station)
+        elif 'longitude' in station and 'latitude' in station:
+            valid.append(station)
+    return valid
+
+
+def build_station_levels(stations, levels, time_str):
+    """Build the stationLevels entries of the all-stations endpoints from the water levels per station"""
+    station_levels = []
+    for station in stations:
+        station_id = station.get('stationId') or station.get('id')
+
+        if not station_id:
+            continue  # Skip stations without an ID
+
+        water_level = levels.get(station_id)
+
+        # Create station data entry even if water level is null
+        station_levels.append({
+            'stationId': station_id,
+            'waterLevel': water_level.get('value') if water_level else None,
+            'timestamp': water_level.get('observed') if water_level else time_str,
+            'latitude': station.get('latitude'),
+            'longitude': station.get('longitude'),
+            'name': station.get('name', 'Unnamed Station')
+        })
+    return station_levels
+
+
 @main_bp.route('/api/nearest_station', methods=['GET'])
 def nearest_station():
-    """Find the nearest water level station to a given coordinate"""
+    """
+    Find the nearest water level stations to a given coordinate
+
+    Optional parameters `k` (number of stations, default 1) and `max_distance` (in metres)
+    limit the result. Distances are returned in metres.
+    """
     try:
         lon = float(request.args.get('lon'))
         lat = float(request.args.get('lat'))
     except (TypeError, ValueError):
         return jsonify({"error": "Invalid coordinates"}), 400
 
-    station = water_level_service.find_nearest_station(lon, lat)
+    try:
+        count = int(request.args.get('k', 1))
+        max_distance = request.args.get('max_distance')
+        max_distance = float(max_distance) if max_distance else None
+    except ValueError:
+        return jsonify({"error": "Invalid k or max_distance"}), 400
+
+    stations = water_level_service.find_nearest_stations(lon, lat, count, max_distance)
 
-    if station:
-        return jsonify({"station": station})
+    if stations:
+        return jsonify({"station": stations[0], "stations": stations})
     else:
         return jsonify({"error": "No station found"}), 404
 
 
+def parse_points(data):
+    """
+    Extract (lon, lat) points from a list of [lon, lat] pairs or {"lon", "lat"} objects,
+    or from the features of a GeoJSON FeatureCollection (non-point geometries use their bbox centre)
+
+    Raises ValueError if a point is invalid.
+    """
+    if data.get('type') == 'FeatureCollection':
+        points = []
+        for index, feature in enumerate(data.get('features') or []):
+            try:
+                bbox = shape(feature['geometry']).bounds
+            except Exception:
+                raise ValueError(f"Invalid geometry in feature {index}")
+            points.append(((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2))
+        return points
+
+    points = []
+    for index, point in enumerate(data.get('points') or []):
+        try:
+            if isinstance(point, dict):
+                lon, lat = float(point['lon']), float(point['lat'])
+            else:
+                lon, lat = float(point[0]), float(point[1])
+        except (KeyError, IndexError, TypeError, ValueError):
+            raise ValueError(f"Invalid coordinates at index {index}")
+        points.append((lon, lat))
+    return points
+
+
+@main_bp.route('/api/nearest_stations', methods=['POST'])
+def nearest_stations():
+    """
+    Find the nearest water level stations to many coordinates in one request
+
+    The body holds `points` as [lon, lat] pairs or {"lon", "lat"} objects, or is a GeoJSON
+    FeatureCollection. Optional `k` and `max_distance` (in metres) work as for /api/nearest_station.
+    Results are returned in the order of the points, with distances in metres. Batches of more than
+    NEAREST_STATIONS_MAX_POINTS points are rejected.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Missing points"}), 400
+
+    max_points = current_app.config.get('NEAREST_STATIONS_MAX_POINTS', 1000)
+    items = data.get('features') if data.get('type') == 'FeatureCollection' else data.get('points')
+    if isinstance(items, list) and len(items) > max_points:
+        return jsonify({"error": f"Too many points, at most {max_points} are allowed per request"}), 413
+
+    try:
+        points = parse_points(data)
+        count = int(data.get('k', 1))
+        max_distance = float(data['max_distance']) if data.get('max_distance') is not None else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    matches = water_level_service.find_nearest_stations_batch(points, count, max_distance)
+
+    return jsonify({"results": [
+        {"station": stations[0] if stations else None, "stations": stations} for stations in matches
+    ]})
+
+
+@main_bp.route('/api/stats')
+def stats():
+    """Get runtime statistics of the outbound connection pools, caches and search fallback"""
+    return jsonify({
+        "search_methods": stac_service.get_search_method_stats(),
+        "http": {
+            "stac": stac_service.http.get_pool_stats(),
+            "dmi": water_level_service.http.get_pool_stats()
+        },
+        "caches": {
+            "search": stac_service.search_cache.get_stats(),
+            "item_assets": stac_service.item_asset_cache.get_stats(),
+            "previews": stac_service.preview_cache.get_stats() if stac_service.preview_cache else None
+        }
+    })
+
+
+@main_bp.route('/metrics')
+def prometheus_metrics():
+    """Expose upstream call, latency and cache metrics in the Prometheus text format"""
+    collected = []
+
+    caches = {
+        "search": stac_service.search_cache,
+        "item_assets": stac_service.item_asset_cache,
+        "enrichment_tokens": stac_service.enrichment_tokens
+    }
+    cache_stats = {name: cache.get_stats() for name, cache in caches.items()}
+    if stac_service.preview_cache:
+        cache_stats["previews"] = stac_service.preview_cache.get_stats()
+    for name, cache in cache_stats.items():
+        labels = {"cache": name}
+        collected += [
+            ("shore_cache_hits_total", "counter", labels, cache["hits"], "Cache hits"),
+            ("shore_cache_misses_total", "counter", labels, cache["misses"], "Cache misses"),
+            ("shore_cache_entries", "gauge", labels, cache.get("entries"), "Entries held in process"),
+            ("shore_cache_bytes", "gauge", labels, cache.get("bytes"), "Bytes held on disk")
+        ]
+
+    for client in (stac_service.http, water_level_service.http):
+        pool = client.get_pool_stats()
+        labels = {"client": client.name}
+        collected += [
+            ("shore_upstream_retries_total", "counter", labels, pool["retries"], "Retried upstream calls"),
+            ("shore_upstream_failures_total", "counter", labels, pool["failures"],
+             "Upstream calls failed after retries"),
+            ("shore_upstream_coalesced_total", "counter", labels, pool["coalesced"],
+             "Upstream calls served by an identical call in flight")
+        ]
+        for host, host_stats in pool["hosts"].items():
+            host_labels = dict(labels, host=host)
+            collected += [
+                ("shore_upstream_connections_total", "counter", host_labels, host_stats["connections"],
+                 "Upstream connections opened"),
+                ("shore_upstream_connection_reuse_ratio", "gauge", host_labels, host_stats["hit_rate"],
+                 "Share of upstream requests sent over a reused connection")
+            ]
+
+    return Response(metrics.registry.render(collected), mimetype='text/plain; version=0.0.4')
+
+
 @main_bp.route('/waterlevel')
 def water_level():
     """Render the water level overview page"""
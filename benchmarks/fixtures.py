@@ -0,0 +1,139 @@
+# benchmarks/fixtures.py
+"""
+Upstream fixtures for the benchmark stand-in server
+
+By default the fixtures are generated deterministically in the shape of the Copernicus STAC
+and DMI responses, so benchmarks need no network access or API key. Recorded responses can
+be used instead by pointing load_fixtures at a directory holding `stac_items.json` (a STAC
+FeatureCollection) and/or `dmi_stations.json` (a DMI station FeatureCollection).
+"""
+import datetime
+import json
+import math
+import os
+import random
+from typing import Any, Dict, List, Optional
+
+# Area of interest covered by the generated items (Danish waters)
+AREA = (7.5, 54.5, 13.0, 57.8)
+# Generated items are spread over this period, newest first
+ITEM_PERIOD_END = datetime.datetime(2024, 6, 30, tzinfo=datetime.timezone.utc)
+ITEM_PERIOD_DAYS = 365
+# Interval between generated DMI observations
+OBSERVATION_INTERVAL = 600
+
+
+def generate_stac_items(count: int = 2500, seed: int = 1) -> List[Dict[str, Any]]:
+    """Generate Sentinel-2 STAC items over the benchmark area, sorted by datetime descending"""
+    rng = random.Random(seed)
+    tiles = [f"32V{letter}{suffix}" for letter in "LMNP" for suffix in ("G", "H", "J")] + \
+            [f"33U{letter}{suffix}" for letter in "UV" for suffix in ("B", "C")]
+    tile_origins = {tile: (rng.uniform(AREA[0], AREA[2] - 1.5), rng.uniform(AREA[1], AREA[3] - 1)) for tile in tiles}
+
+    items = []
+    for index in range(count):
+        tile = tiles[index % len(tiles)]
+        lon, lat = tile_origins[tile]
+        # Partial footprints at swath edges cover only part of the tile
+        width = 1.5 * rng.choice((1, 1, 1, 0.6))
+        captured = ITEM_PERIOD_END - datetime.timedelta(seconds=index * ITEM_PERIOD_DAYS * 86400 / count)
+        captured = captured.replace(minute=(captured.minute // 10) * 10, second=0, microsecond=0)
+        item_id = (f"S2{'AB'[index % 2]}_MSIL2A_{captured:%Y%m%dT%H%M%S}_N0510_R{index % 143:03d}_T{tile}_"
+                   f"{captured:%Y%m%dT%H%M%S}.SAFE")
+        href = f"https://example.invalid/{item_id}"
+        items.append({
+            "type": "Feature",
+            "stac_version": "1.0.0",
+            "id": item_id,
+            "collection": "SENTINEL-2",
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [[[lon, lat], [lon + width, lat], [lon + width, lat + 1], [lon, lat + 1], [lon, lat]]]
+            },
+            "bbox": [lon, lat, lon + width, lat + 1],
+            "properties": {
+                "datetime": captured.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                "platform": f"sentinel-2{'ab'[index % 2]}",
+                "instrument": "msi",
+                "eo:cloud_cover": round(rng.betavariate(0.7, 1.2) * 100, 2),
+                "view:sun_azimuth": round(rng.uniform(150, 170), 3),
+                "view:sun_elevation": round(rng.uniform(10, 58), 3),
+                "s2:tile_id": tile,
+                "s2:product_type": "S2MSI2A",
+                "sat:orbit_state": "descending"
+            },
+            "assets": dict(
+                {band: {"href": f"{href}/{band}.jp2", "type": "image/jp2"}
+                 for band in ("B02", "B03", "B04", "B08", "B11", "B12")},
+                thumbnail={"href": f"{href}/thumbnail.jpg", "type": "image/jpeg"}
+            ),
+            "links": []
+        })
+    return items
+
+
+def generate_dmi_stations(count: int = 80, seed: int = 2) -> List[Dict[str, Any]]:
+    """Generate DMI tide gauge station features along the benchmark area"""
+    rng = random.Random(seed)
+    stations = []
+    for index in range(count):
+        station_type = "Tide-gauge-primary" if index % 4 else "Tide-gauge-secondary"
+        stations.append({
+            "type": "Feature",
+            "geometry": {"type": "Point",
+                         "coordinates": [round(rng.uniform(AREA[0], AREA[2]), 5),
+                                         round(rng.uniform(AREA[1], AREA[3]), 5)]},
+            "properties": {
+                "stationId": f"{25000 + index * 37}",
+                "name": f"Benchmark gauge {index}",
+                "type": station_type,
+                "status": "Active",
+                "parameterId": ["sea_reg", "sealev_dvr", "sealev_ln", "tw"]
+            }
+        })
+    return stations
+
+
+def generate_observations(station_ids: List[str], parameter_id: str, start: datetime.datetime,
+                          end: datetime.datetime) -> List[Dict[str, Any]]:
+    """Generate one observation per OBSERVATION_INTERVAL for each station in a time window"""
+    first = math.ceil(start.timestamp() / OBSERVATION_INTERVAL) * OBSERVATION_INTERVAL
+    features = []
+    for station_id in station_ids:
+        phase = int(station_id) % 360
+        for epoch in range(first, int(end.timestamp()) + 1, OBSERVATION_INTERVAL):
+            # Semi-diurnal tide with a station-specific phase
+            value = round(40 * math.sin(2 * math.pi * epoch / 44712 + phase), 1)
+            features.append({
+                "type": "Feature",
+                "properties": {
+                    "stationId": station_id,
+                    "parameterId": parameter_id,
+                    "observed": datetime.datetime.fromtimestamp(epoch, tz=datetime.timezone.utc)
+                                .strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "value": value,
+                    "qcStatus": "manual"
+                }
+            })
+    return features
+
+
+def load_fixtures(directory: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Load the STAC items and DMI stations served by the stand-in server
+
+    Parameters:
+    - directory: Optional directory with recorded `stac_items.json` and `dmi_stations.json`
+
+    Returns:
+    - Dictionary with the `stac_items` and `dmi_stations` feature lists
+    """
+    fixtures = {}
+    for name, generate in (("stac_items", generate_stac_items), ("dmi_stations", generate_dmi_stations)):
+        path = os.path.join(directory, f"{name}.json") if directory else None
+        if path and os.path.exists(path):
+            with open(path) as f:
+                fixtures[name] = json.load(f)["features"]
+        else:
+            fixtures[name] = generate()
+    return fixtures
@@ -0,0 +1,220 @@
+# benchmarks/run.py
+"""
+Offline benchmark of the SHORE API against a local stand-in for the STAC and DMI APIs
+
+Runs scripted scenarios through the Flask test client and reports p50/p95 latency, upstream
+calls per endpoint and peak RSS for each. No network access or API key is needed.
+
+Usage (from the repository root):
+    python -m benchmarks.run [--latency-ms 50] [--iterations 5] [--cache cold|warm] [--json results.json]
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.fixtures import load_fixtures
+from benchmarks.stub_server import DMI_PREFIX, STAC_PREFIX, StubUpstream
+
+# Whole area and period covered by the fixtures
+AREA_GEOMETRY = {
+    "type": "Polygon",
+    "coordinates": [[[7.5, 54.5], [13.0, 54.5], [13.0, 57.8], [7.5, 57.8], [7.5, 54.5]]]
+}
+SMALL_GEOMETRY = {
+    "type": "Polygon",
+    "coordinates": [[[9.5, 55.5], [11.0, 55.5], [11.0, 56.5], [9.5, 56.5], [9.5, 55.5]]]
+}
+FULL_PERIOD = {"start_date": "2023-07-01", "end_date": "2024-06-30"}
+SNAPSHOT_TIME = "2024-03-01T12:00:00Z"
+DETAILS_BATCH_SIZE = 50
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Return the nearest-rank percentile of a list of values"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def reset_peak_rss():
+    """Reset the peak RSS of the process where the kernel supports it (Linux), so it covers one scenario"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    """Return the peak RSS of the process in MiB"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS, and cannot be reset
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def create_benchmark_app(upstream_url: str, scratch_dir: str):
+    """Create the app with its services pointed at the stand-in server and no local persistence"""
+    # Configuration is read from the environment when app.config is imported
+    os.environ.update({
+        "DMI_API_KEY": "benchmark",
+        "OBSERVATION_STORE_PATH": "",
+        "TILE_STATION_INDEX_PATH": "",
+        "PREVIEW_CACHE_PATH": os.path.join(scratch_dir, "previews")
+    })
+    os.environ.pop("REDIS_URL", None)
+
+    from app import create_app
+    from app.views.main import stac_service, water_level_service
+
+    app = create_app("testing")
+    stac_service.stac_base_url = f"{upstream_url}{STAC_PREFIX}"
+    water_level_service.base_url = f"{upstream_url}{DMI_PREFIX}"
+    return app
+
+
+def reset_caches():
+    """Drop everything the services have cached, so the next request starts cold"""
+    from app.views.main import stac_service, water_level_service
+
+    for cache in (stac_service.search_cache, stac_service.item_asset_cache, stac_service.enrichment_tokens,
+                  stac_service._refill_cursors):
+        cache.clear()
+    water_level_service.station_catalogue.invalidate()
+    water_level_service.set_tile_station_index(None, water_level_service.tile_stations.candidates)
+
+
+def build_scenarios(client, fixtures: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Callable[[], int]]:
+    """
+    Build the benchmark scenarios
+
+    Returns:
+    - Dictionary mapping scenario name to a function running it once and returning the number of results
+    """
+    def search(limit: int, geometry: Dict[str, Any], max_cloud_coverage: int) -> Callable[[], int]:
+        def run():
+            response = client.post("/api/search_images", json=dict(
+                FULL_PERIOD, geometry=geometry, limit=limit, page=1, max_cloud_coverage=max_cloud_coverage))
+            assert response.status_code == 200, response.get_data(as_text=True)
+            return len(response.get_json()["images"])
+        return run
+
+    def export():
+        response = client.post("/api/search_images/export", json=dict(
+            FULL_PERIOD, geometry=AREA_GEOMETRY, max_cloud_coverage=60, limit=250, format="csv"))
+        assert response.status_code == 200
+        # Reading the body drives the streamed export to the end
+        return response.get_data().count(b"\n") - 1
+
+    def snapshot():
+        response = client.get(f"/api/water_level_at_time?time={SNAPSHOT_TIME}")
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return len(response.get_json()["stationLevels"])
+
+    image_ids = [item["id"].replace(".SAFE", "") for item in fixtures["stac_items"][:DETAILS_BATCH_SIZE * 4:4]]
+
+    def details():
+        response = client.post("/api/image_details", json={"ids": image_ids})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return sum(1 for image in response.get_json()["images"].values() if image)
+
+    return {
+        "search_20": search(20, SMALL_GEOMETRY, 30),
+        "search_100": search(100, AREA_GEOMETRY, 100),
+        "search_1000": search(1000, AREA_GEOMETRY, 100),
+        "export_csv": export,
+        "snapshot": snapshot,
+        f"details_{DETAILS_BATCH_SIZE}": details
+    }
+
+
+def run_scenario(name: str, scenario: Callable[[], int], stub: StubUpstream, iterations: int,
+                 warm: bool) -> Dict[str, Any]:
+    """Run one scenario and collect its latency, upstream calls and peak RSS"""
+    reset_caches()
+    if warm:
+        scenario()
+    reset_peak_rss()
+    stub.reset_calls()
+
+    durations = []
+    results = 0
+    for _ in range(iterations):
+        if not warm:
+            reset_caches()
+        started = time.perf_counter()
+        results = scenario()
+        durations.append(time.perf_counter() - started)
+
+    calls = stub.calls()
+    return {
+        "scenario": name,
+        "results": results,
+        "p50_ms": percentile(durations, 0.5) * 1000,
+        "p95_ms": percentile(durations, 0.95) * 1000,
+        "upstream_calls": sum(calls.values()) / iterations,
+        "upstream_by_endpoint": {endpoint: count / iterations for endpoint, count in sorted(calls.items())},
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def print_report(reports: List[Dict[str, Any]]):
+    """Print the results as a table"""
+    print(f"{'scenario':<14} {'results':>8} {'p50 ms':>9} {'p95 ms':>9} {'upstream':>9} {'peak MiB':>9}  "
+          f"calls/iteration")
+    for report in reports:
+        endpoints = ", ".join(f"{endpoint}={count:g}" for endpoint, count in report["upstream_by_endpoint"].items())
+        print(f"{report['scenario']:<14} {report['results']:>8} {report['p50_ms']:>9.1f} {report['p95_ms']:>9.1f} "
+              f"{report['upstream_calls']:>9g} {report['peak_rss_mb']:>9.1f}  {endpoints}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the SHORE API against a local stand-in upstream")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Latency injected into every upstream call")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Maximum random latency added on top")
+    parser.add_argument("--iterations", type=int, default=5, help="Measured runs per scenario")
+    parser.add_argument("--cache", choices=("cold", "warm"), default="cold",
+                        help="Clear the service caches before every run, or warm them with one unmeasured run")
+    parser.add_argument("--scenario", action="append", help="Run only the named scenario (repeatable)")
+    parser.add_argument("--fixtures", help="Directory with recorded stac_items.json and dmi_stations.json")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    fixtures = load_fixtures(args.fixtures)
+    stub = StubUpstream(fixtures, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000).start()
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="shore-benchmark-") as scratch_dir:
+            app = create_benchmark_app(stub.url, scratch_dir)
+            scenarios = build_scenarios(app.test_client(), fixtures)
+            unknown = set(args.scenario or []) - set(scenarios)
+            if unknown:
+                parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}; choose from {', '.join(scenarios)}")
+
+            reports = [run_scenario(name, scenario, stub, args.iterations, args.cache == "warm")
+                       for name, scenario in scenarios.items() if not args.scenario or name in args.scenario]
+    finally:
+        stub.stop()
+
+    print_report(reports)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"settings": vars(args), "scenarios": reports}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+# benchmarks/stub_server.py
+"""
+Local stand-in for the Copernicus STAC and DMI oceanObs APIs
+
+Serves the benchmark fixtures under /stac and /v2/oceanObs with the query semantics the
+services rely on (datetime, bbox, cloud cover filters, paging, ids search and offset
+pagination), after an injected latency. Every call is counted per endpoint.
+"""
+import datetime
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from benchmarks.fixtures import generate_observations
+
+STAC_PREFIX = "/stac"
+DMI_PREFIX = "/v2/oceanObs"
+
+_CLOUD_FILTER = re.compile(r"eo:cloud_cover\s*<=\s*([\d.]+)")
+
+
+def parse_interval(value: Optional[str]) -> Tuple[Optional[datetime.datetime], Optional[datetime.datetime]]:
+    """Parse a STAC/OGC datetime interval such as `2024-01-01T00:00:00Z/..`"""
+    if not value:
+        return None, None
+    bounds = []
+    for part in (value.split("/") + [value])[:2]:
+        if part in ("", ".."):
+            bounds.append(None)
+        else:
+            bounds.append(datetime.datetime.fromisoformat(part.replace("Z", "+00:00")))
+    return bounds[0], bounds[1]
+
+
+def bbox_intersects(bbox: List[float], other: List[float]) -> bool:
+    """Return whether two (minx, miny, maxx, maxy) boxes overlap"""
+    return bbox[0] <= other[2] and other[0] <= bbox[2] and bbox[1] <= other[3] and other[1] <= bbox[3]
+
+
+class StubUpstream:
+    """Threaded HTTP server standing in for the STAC and DMI APIs"""
+
+    def __init__(self, fixtures: Dict[str, List[Dict[str, Any]]], latency: float = 0.05, jitter: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0, seed: int = 3):
+        """
+        Parameters:
+        - fixtures: STAC items and DMI stations, as returned by load_fixtures
+        - latency: Seconds every response is delayed by
+        - jitter: Maximum extra seconds added at random to the latency
+        - host: Interface to listen on
+        - port: Port to listen on (0 picks a free one)
+        - seed: Seed of the latency jitter
+        """
+        self.items = fixtures["stac_items"]
+        self.items_by_id = {item["id"]: item for item in self.items}
+        for item in self.items:
+            item["_datetime"] = datetime.datetime.fromisoformat(item["properties"]["datetime"].replace("Z", "+00:00"))
+        self.stations = fixtures["dmi_stations"]
+        self.latency = latency
+        self.jitter = jitter
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._calls = Counter()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                stub._handle(self, None)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                stub._handle(self, json.loads(self.rfile.read(length) or b"{}"))
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server"""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubUpstream":
+        """Serve requests in a background thread"""
+        self._thread = threading.Thread(target=self.server.serve_forever, name="stub-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket"""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def calls(self) -> Dict[str, int]:
+        """Return the number of calls per endpoint"""
+        with self._lock:
+            return dict(self._calls)
+
+    def reset_calls(self):
+        """Reset the call counters"""
+        with self._lock:
+            self._calls.clear()
+
+    def _handle(self, handler: BaseHTTPRequestHandler, body: Optional[Dict[str, Any]]):
+        """Route a request, wait for the injected latency and send the JSON response"""
+        url = urlparse(handler.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        endpoint, status, payload = self._route(handler.command, url.path, query, body)
+
+        with self._lock:
+            self._calls[endpoint] += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        data = json.dumps(payload).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/geo+json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _route(self, method: str, path: str, query: Dict[str, str],
+               body: Optional[Dict[str, Any]]) -> Tuple[str, int, Dict[str, Any]]:
+        """Return the endpoint name, status code and payload of a request"""
+        if path == f"{STAC_PREFIX}/collections/SENTINEL-2/items":
+            return "stac GET items", *self._search(path, query, query)
+        if path.startswith(f"{STAC_PREFIX}/collections/SENTINEL-2/items/"):
+            item = self.items_by_id.get(path.rsplit("/", 1)[1])
+            if item is None:
+                return "stac GET item", 404, {"code": "NotFound"}
+            return "stac GET item", 200, self._public(item)
+        if path == f"{STAC_PREFIX}/search" and method == "POST":
+            return "stac POST search", *self._search(path, body or {}, None)
+        if path == f"{STAC_PREFIX}/search" and "ids" in query:
+            ids = query["ids"].split(",")
+            features = [self._public(self.items_by_id[item_id]) for item_id in ids if item_id in self.items_by_id]
+            return "stac GET search ids", 200, self._collection(features, len(features), [])
+        if path == f"{STAC_PREFIX}/search":
+            return "stac GET search", *self._search(path, query, query)
+        if path == f"{DMI_PREFIX}/collections/station/items":
+            return "dmi stations", 200, {"type": "FeatureCollection", "features": self.stations,
+                                         "numberReturned": len(self.stations)}
+        if path == f"{DMI_PREFIX}/collections/observation/items":
+            return "dmi observations", 200, self._observations(query)
+        return "unknown", 404, {"code": "NotFound"}
+
+    def _search(self, path: str, params: Dict[str, Any], query: Optional[Dict[str, str]]) -> Tuple[int, Dict[str, Any]]:
+        """
+        Search the STAC items
+
+        Parameters:
+        - path: Request path, used for the next and prev links
+        - params: GET query parameters or POST body
+        - query: GET query parameters the links are built from, or None for POST searches
+        """
+        start, end = parse_interval(params.get("datetime"))
+        bbox = params.get("bbox")
+        if isinstance(bbox, str):
+            bbox = [float(value) for value in bbox.split(",")]
+
+        max_cloud = None
+        cloud_filter = _CLOUD_FILTER.search(params.get("filter") or "")
+        if cloud_filter:
+            max_cloud = float(cloud_filter.group(1))
+        elif isinstance(params.get("query"), dict):
+            max_cloud = params["query"].get("eo:cloud_cover", {}).get("lte")
+
+        matches = [item for item in self.items
+                   if (start is None or item["_datetime"] >= start) and (end is None or item["_datetime"] <= end)
+                   and (bbox is None or bbox_intersects(bbox, item["bbox"]))
+                   and (max_cloud is None or item["properties"]["eo:cloud_cover"] <= max_cloud)]
+
+        sortby = params.get("sortby") or "-datetime"
+        if isinstance(sortby, list):
+            sortby = sortby[0] if sortby else "-datetime"
+        field = sortby.lstrip("+-")
+        if field != "datetime" or not sortby.startswith("-"):
+            key = (lambda item: item["_datetime"]) if field == "datetime" else \
+                (lambda item: item["properties"].get(field) or 0)
+            matches.sort(key=key, reverse=sortby.startswith("-"))
+
+        limit = int(params.get("limit") or 10)
+        page = int(params.get("page") or 1)
+        features = [self._public(item) for item in matches[(page - 1) * limit:page * limit]]
+
+        links = []
+        if query is not None:
+            base = f"{self.url}{path}?"
+            if page * limit < len(matches):
+                links.append({"rel": "next", "href": base + urlencode(dict(query, page=page + 1))})
+            if page > 1:
+                links.append({"rel": "prev", "href": base + urlencode(dict(query, page=page - 1))})
+        elif page * limit < len(matches):
+            links.append({"rel": "next", "method": "POST", "body": dict(params, page=page + 1),
+                          "href": f"{self.url}{path}"})
+        return 200, self._collection(features, len(matches), links)
+
+    def _observations(self, query: Dict[str, str]) -> Dict[str, Any]:
+        """Generate the observations of one station or all stations in a bbox, with offset pagination"""
+        start, end = parse_interval(query.get("datetime"))
+        if "stationId" in query:
+            station_ids = [query["stationId"]]
+        else:
+            bbox = [float(value) for value in query["bbox"].split(",")] if "bbox" in query else None
+            station_ids = [station["properties"]["stationId"] for station in self.stations
+                           if bbox is None or bbox_intersects(bbox, station["geometry"]["coordinates"] * 2)]
+
+        features = generate_observations(station_ids, query.get("parameterId", "sealev_dvr"), start, end)
+        offset = int(query.get("offset") or 0)
+        limit = int(query.get("limit") or 1000)
+        page = features[offset:offset + limit]
+        return {"type": "FeatureCollection", "features": page, "numberReturned": len(page)}
+
+    @staticmethod
+    def _public(item: Dict[str, Any]) -> Dict[str, Any]:
+        """Strip the fields only used by the server from an item"""
+        return {key: value for key, value in item.items() if not key.startswith("_")}
+
+    @staticmethod
+    def _collection(features: List[Dict[str, Any]], matched: int, links: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build a STAC ItemCollection response"""
+        return {
+            "type": "FeatureCollection",
+            "features": features,
+            "links": links,
+            "context": {"returned": len(features), "limit": len(features), "matched": matched}
+        }
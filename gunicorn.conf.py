@@ -0,0 +1,26 @@
+# gunicorn.conf.py
+"""
+Gunicorn worker configuration
+
+The API views spend nearly all their time waiting on the STAC and DMI APIs. gevent workers
+patch the standard library at startup, so the blocking `requests` calls in the services yield
+to other requests while they wait and one worker can have hundreds of upstream calls in flight.
+The enrichment thread pool and the background probes run as greenlets in the same way.
+
+Environment variables:
+- WEB_CONCURRENCY: Number of worker processes (set by Heroku from the dyno size)
+- GUNICORN_WORKER_CLASS: Worker class; use "gthread" to fall back to threads without gevent
+- GUNICORN_WORKER_CONNECTIONS: Concurrent requests per gevent worker
+- GUNICORN_THREADS: Threads per gthread worker
+- GUNICORN_TIMEOUT: Seconds a worker may be silent before it is restarted
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 500))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5